@@ -0,0 +1,68 @@
+"""
+Schema management, run once per deploy instead of on every worker start:
+
+    python -m app.database.migrate
+
+Creates missing tables, adds columns/indexes that newer models have but an
+existing database lacks (e.g. culture_images.position, cultures.latitude),
+and sets up the full-text search index. Every step is idempotent.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from ..models import culture, culture_image, lease, media_item, quiz, quiz_job, quiz_set  # noqa: F401  (register tables)
+from ..utils.search import ensure_search_index
+from .session import Base, engine
+
+log = logging.getLogger(__name__)
+
+
+def _add_column_sql(table, col, dialect) -> str:
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=dialect)}"
+    default = col.server_default.arg if col.server_default is not None else None
+    if default is not None:
+        ddl += f" DEFAULT {default if isinstance(default, str) else default.text}"
+        if not col.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def migrate(bind=engine) -> list[str]:
+    """Bring the database up to the current models; returns what was changed."""
+    changes: list[str] = []
+    existing = set(inspect(bind).get_table_names())
+
+    Base.metadata.create_all(bind=bind)
+    changes += [f"create table {t}" for t in Base.metadata.tables if t not in existing]
+
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            have = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    conn.execute(text(_add_column_sql(table, col, bind.dialect)))
+                    changes.append(f"add column {table.name}.{col.name}")
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    changes.append(f"create index {index.name}")
+
+    ensure_search_index(bind)
+    return changes
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    changes = migrate()
+    for change in changes:
+        log.info(change)
+    log.info("schema up to date (%d changes)", len(changes))
+
+
+if __name__ == "__main__":
+    main()
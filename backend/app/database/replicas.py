@@ -0,0 +1,217 @@
+"""
+Routing of read-only sessions to replica engines.
+
+Reads go round-robin over the replicas that passed their last health
+check (connectable and, on PostgreSQL, replaying within REPLICA_MAX_LAG
+seconds), and fall back to the primary when none did.
+
+Routes that change the catalog declare `Depends(mark_write)`; for
+READ_YOUR_WRITES_SECONDS after such a write succeeds, that client's reads
+go to the primary (across workers, via a cookie set on the response).
+Other clients keep reading from replicas; response-cache entries they
+refill from a replica that hasn't caught up yet are dropped by a second
+invalidation once the window has passed (`after_catch_up`).
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection, Request
+
+from ..config import settings
+from ..utils.metrics import registry
+
+log = logging.getLogger(__name__)
+
+STICKY_COOKIE = "read_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# 0 when the replica has replayed everything it received
+_PG_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaSet:
+    def __init__(self, primary: Engine, replicas: list[Engine]):
+        self.primary = primary
+        self.replicas = replicas
+        self.names = {primary: "primary", **{e: f"replica{i}" for i, e in enumerate(replicas)}}
+        self.healthy = {e: True for e in replicas}
+        self.routed = {name: 0 for name in self.names.values()}
+        self._sessions = {
+            e: sessionmaker(autocommit=False, autoflush=False, bind=e) for e in self.names
+        }
+        self._next = itertools.count()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._repeat: dict[tuple, float] = {}  # (fn, args) -> when to call it again
+        for replica in replicas:
+            self._watch_disconnects(replica)
+
+    def _watch_disconnects(self, replica: Engine):
+        # don't wait for the next health check once a replica drops connections
+        @event.listens_for(replica, "handle_error")
+        def _down(context):
+            if context.is_disconnect and self.healthy.get(replica):
+                self.healthy[replica] = False
+                log.warning("%s marked down: %s", self.names[replica], context.original_exception)
+
+    def pick(self, primary: bool = False) -> Engine:
+        if not primary:
+            up = [e for e in self.replicas if self.healthy[e]]
+            if up:
+                return up[next(self._next) % len(up)]
+        return self.primary
+
+    def session(self, primary: bool = False):
+        engine = self.pick(primary)
+        self.routed[self.names[engine]] += 1
+        return self._sessions[engine]()
+
+    def after_catch_up(self, fn, *args):
+        """
+        Call fn(*args) again once replicas have had time to apply a write.
+        Safe from any thread. Repeats of the same call share one timer,
+        which runs it again at the latest of their deadlines.
+        """
+        if self.replicas and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule, (fn, args))
+
+    def _schedule(self, key: tuple):
+        deadline = self._loop.time() + settings.read_your_writes_seconds
+        if key not in self._repeat:
+            self._loop.call_at(deadline, self._fire, key)
+        self._repeat[key] = deadline
+
+    def _fire(self, key: tuple):
+        if key not in self._repeat:
+            return  # stopped meanwhile
+        fn, args = key
+        # may block on the cache backend: keep it off the loop
+        self._loop.run_in_executor(None, fn, *args)
+        deadline = self._repeat[key]
+        if deadline > self._loop.time():
+            self._loop.call_at(deadline, self._fire, key)
+        else:
+            del self._repeat[key]
+
+    def check(self, replica: Engine) -> bool:
+        try:
+            with replica.connect() as conn:
+                if replica.dialect.name == "postgresql":
+                    lag = float(conn.execute(_PG_LAG).scalar() or 0)
+                    if lag > settings.replica_max_lag:
+                        log.warning("%s is %.1fs behind", self.names[replica], lag)
+                        return False
+                else:
+                    conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            log.warning("%s health check failed: %s", self.names[replica], e)
+            return False
+
+    def check_all(self):
+        for replica in self.replicas:
+            ok = self.check(replica)
+            if ok != self.healthy[replica]:
+                log.info("%s is %s", self.names[replica], "up" if ok else "down")
+            self.healthy[replica] = ok
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.check_all)
+            await asyncio.sleep(settings.replica_check_interval)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._loop = None
+            self._repeat.clear()
+
+    def metrics(self) -> list[str]:
+        lines = [
+            "# HELP db_pool_connections Connections per engine pool by state.",
+            "# TYPE db_pool_connections gauge",
+        ]
+        for engine, name in self.names.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue  # SQLite's pools don't keep these counts
+            for state, value in (
+                ("size", pool.size()), ("checked_out", pool.checkedout()),
+                ("checked_in", pool.checkedin()), ("overflow", max(pool.overflow(), 0)),
+            ):
+                lines.append(f'db_pool_connections{{engine="{name}",state="{state}"}} {value}')
+        lines += [
+            "# HELP db_read_sessions_total Read sessions opened per engine.",
+            "# TYPE db_read_sessions_total counter",
+            *(f'db_read_sessions_total{{engine="{n}"}} {v}' for n, v in self.routed.items()),
+            "# HELP db_replica_up Whether the replica passed its last health check.",
+            "# TYPE db_replica_up gauge",
+            *(f'db_replica_up{{engine="{self.names[e]}"}} {int(ok)}' for e, ok in self.healthy.items()),
+        ]
+        return lines
+
+
+def wants_primary(conn: HTTPConnection) -> bool:
+    """Inside this client's read-your-writes window."""
+    try:
+        return float(conn.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def mark_write(request: Request):
+    """Dependency for routes that change what the read routes serve."""
+    request.state.wrote_catalog = True
+
+
+class ReadYourWritesMiddleware:
+    """
+    Gives the client of a successful `mark_write` route a cookie pinning
+    its reads to the primary for READ_YOUR_WRITES_SECONDS. Other unsafe
+    requests (chat, quiz generation) change nothing replicas serve and
+    leave routing alone.
+    """
+
+    def __init__(self, app, replicas: ReplicaSet):
+        self.app = app
+        self.replicas = replicas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not self.replicas.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and scope.get("state", {}).get("wrote_catalog")
+            ):
+                window = settings.read_your_writes_seconds
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{STICKY_COOKIE}={time.time() + window:.0f}; Max-Age={window:.0f}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def register_metrics(replicas: ReplicaSet):
+    registry.collector(replicas.metrics)
@@ -1,12 +1,122 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database.session import engine, Base
-from .routes import cultures, quiz, chat,media
-from dotenv import load_dotenv
-import os
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .database.replicas import ReadYourWritesMiddleware
+from .database.session import engine, async_engine, SessionLocal, replica_engines, replicas
+from .models.culture import Culture
+from .routes import cultures, quiz, chat,media, metrics, images
+from .utils.compression import CompressionMiddleware
+from .utils.geo import geo_index
+from .utils.images import image_service
+from .utils.index_sync import index_sync
+from .utils.llm import close_llm, llm_configured
+from .utils.metrics import MetricsMiddleware, instrument_engine, profiler
+from .utils.quiz_bank import quiz_bank_worker
+from .utils.quiz_batch import quiz_batch_runner
+from .utils.retrieval import vector_index
+from .utils.snapshot import snapshot_worker
+from .utils.suggest import suggest_index
+
+log = logging.getLogger(__name__)
+
+
+def build_suggest_index():
+    db = SessionLocal()
+    try:
+        suggest_index.rebuild(
+            db.query(Culture.slug, Culture.name, Culture.region, Culture.language)
+        )
+    finally:
+        db.close()
+
+
+def build_geo_index():
+    db = SessionLocal()
+    try:
+        geo_index.rebuild(
+            db.query(Culture.slug, Culture.name, Culture.latitude, Culture.longitude)
+            .filter(Culture.latitude.isnot(None), Culture.longitude.isnot(None))
+        )
+    finally:
+        db.close()
+
+
+def build_indexes():
+    build_suggest_index()
+    build_geo_index()
+
+
+def _vector_rows(db):
+    return db.query(
+        Culture.slug, Culture.name, Culture.region, Culture.location,
+        Culture.language, Culture.population,
+        Culture.about, Culture.traditions, Culture.lifestyle,
+    )
 
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env"))
+def build_vector_index():
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        vector_index.rebuild(_vector_rows(db))
+    finally:
+        db.close()
+    log.info("vector index: %d chunks in %.0f ms", len(vector_index), (time.perf_counter() - started) * 1000)
+
+
+def sync_vector_index():
+    db = SessionLocal()
+    try:
+        vector_index.sync(_vector_rows(db))
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if settings.auto_migrate:
+        from .database.migrate import migrate
+        await run_in_threadpool(migrate)
+    index_sync.register("suggest", build_suggest_index)
+    index_sync.register("geo", build_geo_index)
+    index_sync.register("vectors", sync_vector_index)
+    index_sync.start()
+    await run_in_threadpool(build_indexes)
+    # the slowest index is built off the startup path: until it is ready,
+    # chat/quiz prompts fall back to chunking the one culture on the spot
+    vector_build = asyncio.create_task(asyncio.to_thread(build_vector_index))
+    profiler.start()
+    replicas.start()
+    if settings.snapshot_on_write:
+        snapshot_worker.start()
+    if llm_configured():
+        quiz_bank_worker.start()
+        await quiz_batch_runner.resume_interrupted()
+    else:
+        log.warning("OPENAI_API_KEY is not set: chat and quiz generation will fail, quiz bank is off")
+    log.info("startup finished in %.0f ms", (time.perf_counter() - started) * 1000)
+
+    yield
+
+    if not vector_build.done():
+        vector_build.cancel()
+    await index_sync.stop()
+    await replicas.stop()
+    await asyncio.to_thread(snapshot_worker.stop)
+    await quiz_bank_worker.stop()
+    await quiz_batch_runner.stop()
+    await close_llm()
+    await image_service.close()
+
 
 app = FastAPI(
     title="Culturology API",
@@ -14,27 +124,30 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
-origins = [
-    "http://localhost:5173",
-    
-]
-
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ReadYourWritesMiddleware, replicas=replicas)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,       
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],          
-    allow_headers=["*"],          
+    allow_methods=["*"],
+    allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
-
-Base.metadata.create_all(bind=engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+for replica in replica_engines:
+    instrument_engine(replica)
 
 app.include_router(cultures.router, prefix="/api/cultures", tags=["cultures"])
 app.include_router(quiz.router)
 app.include_router(chat.router)
-app.include_router(media.router) 
-
+app.include_router(media.router)
+app.include_router(metrics.router)
+app.include_router(images.router)
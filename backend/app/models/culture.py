@@ -1,10 +1,13 @@
 
-from sqlalchemy import Column, Integer, String, Text, Float
+from sqlalchemy import Column, Integer, String, Text, Float, Index
 from sqlalchemy.orm import relationship
 from ..database.session import Base
 
 class Culture(Base):
     __tablename__ = "cultures"
+    __table_args__ = (
+        Index("ix_cultures_lat_lon", "latitude", "longitude"),
+    )
     latitude   = Column(Float)   
     longitude  = Column(Float)   
     id          = Column(Integer, primary_key=True, index=True)
@@ -19,4 +22,8 @@ class Culture(Base):
     lifestyle   = Column(Text)
 
     
-    gallery = relationship("CultureImage", cascade="all, delete-orphan")
+    gallery = relationship(
+        "CultureImage",
+        cascade="all, delete-orphan",
+        order_by="[CultureImage.position, CultureImage.id]",
+    )
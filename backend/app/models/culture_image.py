@@ -5,6 +5,7 @@ class CultureImage(Base):
     __tablename__ = "culture_images"
 
     id         = Column(Integer, primary_key=True)
-    culture_id = Column(Integer, ForeignKey("cultures.id", ondelete="CASCADE"))
+    culture_id = Column(Integer, ForeignKey("cultures.id", ondelete="CASCADE"), index=True)
     url        = Column(String, nullable=False)           
-    caption    = Column(String(255))                      
+    caption    = Column(String(255))
+    position   = Column(Integer, nullable=False, default=0, server_default="0")                      
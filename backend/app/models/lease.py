@@ -0,0 +1,10 @@
+from sqlalchemy import Column, DateTime, String
+from ..database.session import Base
+
+class Lease(Base):
+    """A named, expiring claim on a piece of background work, shared by all workers."""
+    __tablename__ = "leases"
+
+    name       = Column(String(128), primary_key=True)
+    owner      = Column(String(64), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Text
 from ..database.session import Base
 
 class MediaItem(Base):
@@ -10,3 +10,7 @@ class MediaItem(Base):
     caption       = Column(Text,   nullable=True)                   
     subtitles_url = Column(String, nullable=True)                   
     duration      = Column(Integer, nullable=True)                 
+    # set for files hosted by us: path under MEDIA_DIR, served by /api/media/{id}/stream
+    file_path     = Column(String, nullable=True)
+    size          = Column(BigInteger, nullable=True)
+    mime_type     = Column(String(100), nullable=True)
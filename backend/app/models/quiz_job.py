@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, JSON, String, func
+from ..database.session import Base
+
+class QuizJob(Base):
+    """A catalog-wide quiz generation run; progress is persisted so it can resume."""
+    __tablename__ = "quiz_jobs"
+
+    id         = Column(Integer, primary_key=True)
+    status     = Column(String(16), nullable=False, default="pending")
+    slugs      = Column(JSON, nullable=False)                # targets, in order
+    done       = Column(JSON, nullable=False, default=list)  # slugs with a stored set
+    failed     = Column(JSON, nullable=False, default=dict)  # slug -> last error
+    owner      = Column(String(64))                          # worker running it, see utils/leases.py
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, JSON, String, func
+from ..database.session import Base
+
+class QuizSet(Base):
+    """A pre-generated set of QuizItem dicts for one version of a culture's text."""
+    __tablename__ = "quiz_sets"
+
+    id           = Column(Integer, primary_key=True)
+    culture_id   = Column(Integer, ForeignKey("cultures.id", ondelete="CASCADE"), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    items        = Column(JSON, nullable=False)
+    created_at   = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_quiz_sets_culture_hash", "culture_id", "content_hash"),
+    )
@@ -1,24 +1,142 @@
-import os
-from dotenv import load_dotenv
+import asyncio
+import json
 
-import openai
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.session import get_db
+from ..database.session import get_async_db
 from ..models.culture import Culture
 from ..schemas.chat import ChatRequest, ChatResponse
+from ..utils.admission import Ticket, admission
+from ..utils.chat_cache import answer_cache, bypass_requested
+from ..utils.llm import LLMError, get_llm
+from ..utils.retrieval import MIN_GENERAL_SCORE, culture_context, vector_index
+from ..utils.singleflight import llm_flight, normalize_prompt
 
-# Загружаем переменные из .env
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env"))
+router = APIRouter(prefix="/api/chat", tags=["chat"])
 
-# Устанавливаем API-ключ
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_KEY:
-    raise RuntimeError("OPENAI_API_KEY not set in environment")
-openai.api_key = OPENAI_KEY
 
-router = APIRouter(prefix="/api/chat", tags=["chat"])
+def culture_messages(culture: Culture, question: str) -> list[dict]:
+    system_prompt = (
+        "You are a knowledgeable assistant about indigenous cultures. "
+        f"Current topic: '{culture.name}' culture (region: {culture.region}).\n"
+        "Answer from these reference notes where they apply:\n"
+        + "\n".join(f"- {note}" for note in culture_context(culture, question))
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user",   "content": question},
+    ]
+
+
+def general_messages(question: str) -> list[dict]:
+    system_prompt = (
+        "You are a helpful assistant for the Culturology website. "
+        "Feel free to answer any questions about indigenous cultures, "
+        "their traditions, languages, history and how the site works."
+    )
+    notes = vector_index.context(question, min_score=MIN_GENERAL_SCORE)
+    if notes:
+        system_prompt += "\nRelevant notes from the catalog:\n" + "\n".join(f"- {n}" for n in notes)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user",   "content": question},
+    ]
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def cached_or_admit(
+    request: Request, slug: str | None, question: str, bypass: bool
+) -> tuple[str | None, Ticket | None]:
+    """
+    Look the answer up once, before the stream starts: a hit never touches
+    the LLM and skips admission, a miss is admitted here (so it can still
+    get a 429/503) and then goes upstream whatever the cache does meanwhile.
+    """
+    cached = None if bypass else answer_cache.get(slug, question)
+    if cached is not None:
+        return cached, None
+    return None, await admission.admit(request)
+
+
+def stream_answer(slug: str | None, question: str, messages, cached: str | None, ticket: Ticket | None):
+    """
+    Relay upstream tokens as SSE: `token` events, then one `done` event
+    with usage (or `error`). If the client disconnects, the response task
+    is cancelled, which closes the upstream stream and frees its slot. The
+    admission ticket is released when the stream ends, or by the
+    background task if it never started.
+    """
+    async def events():
+        if cached is not None:
+            yield sse("token", {"delta": cached})
+            yield sse("done", {"usage": {}, "cached": True})
+            return
+
+        parts: list[str] = []
+        try:
+            async for kind, value in get_llm().stream(messages, temperature=0.7, max_tokens=500):
+                if kind == "delta":
+                    parts.append(value)
+                    yield sse("token", {"delta": value})
+                else:
+                    answer_cache.set(slug, question, "".join(parts).strip())
+                    yield sse("done", {"usage": value, "cached": False})
+        except LLMError as e:
+            yield sse("error", {"detail": f"OpenAI API error: {e}"})
+        finally:
+            if ticket is not None:
+                await ticket.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+
+@router.post(
+    "/stream",
+    summary="Общий вопрос по сайту Culturology (потоковый ответ, SSE)",
+)
+async def chat_general_stream(payload: ChatRequest, request: Request):
+    bypass = bypass_requested(request.headers)
+    messages = await asyncio.to_thread(general_messages, payload.question)
+    cached, ticket = await cached_or_admit(request, None, payload.question, bypass)
+    return stream_answer(None, payload.question, messages, cached, ticket)
+
+
+@router.post(
+    "/{slug}/stream",
+    summary="Вопрос по конкретной культуре (потоковый ответ, SSE)",
+)
+async def chat_with_culture_stream(
+    request: Request,
+    slug: str = Path(..., description="Slug культуры"),
+    payload: ChatRequest = ...,
+    db: AsyncSession = Depends(get_async_db),
+):
+    culture = (
+        await db.execute(select(Culture).where(Culture.slug == slug))
+    ).scalars().first()
+    if not culture:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Culture not found",
+        )
+    bypass = bypass_requested(request.headers)
+    messages = await asyncio.to_thread(culture_messages, culture, payload.question)
+    # the stream can run for a while; don't keep a pooled connection for it
+    await db.close()
+    cached, ticket = await cached_or_admit(request, slug, payload.question, bypass)
+    return stream_answer(slug, payload.question, messages, cached, ticket)
 
 
 @router.post(
@@ -27,41 +145,45 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
     summary="Задать вопрос по конкретной культуре",
 )
 async def chat_with_culture(
+    request: Request,
+    response: Response,
     slug: str = Path(..., description="Slug культуры"),
     payload: ChatRequest = ...,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    culture = db.query(Culture).filter(Culture.slug == slug).first()
+    bypass = bypass_requested(request.headers)
+    if not bypass:
+        cached = answer_cache.get(slug, payload.question)
+        if cached is not None:
+            response.headers["X-Chat-Cache"] = "hit"
+            return ChatResponse(answer=cached)
+
+    culture = (
+        await db.execute(select(Culture).where(Culture.slug == slug))
+    ).scalars().first()
     if not culture:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Culture not found",
         )
 
-    system_prompt = (
-        "You are a knowledgeable assistant about indigenous cultures. "
-        f"Current topic: '{culture.name}' culture (region: {culture.region})."
-    )
-    user_prompt = payload.question
-
+    messages = await asyncio.to_thread(culture_messages, culture, payload.question)
+    await db.close()
     try:
-        resp = await openai.ChatCompletion.acreate(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": user_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=500,
-        )
-    except Exception as e:
+        async with await admission.admit(request):
+            resp = await llm_flight.do(
+                ("chat", slug, normalize_prompt(payload.question)),
+                lambda: get_llm().chat(messages, temperature=0.7, max_tokens=500),
+            )
+    except LLMError as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"OpenAI API error: {e}"
         )
 
-    answer = resp.choices[0].message.content.strip()
-    return ChatResponse(answer=answer)
+    answer_cache.set(slug, payload.question, resp.content)
+    response.headers["X-Chat-Cache"] = "bypass" if bypass else "miss"
+    return ChatResponse(answer=resp.content)
 
 
 @router.post(
@@ -71,27 +193,29 @@ async def chat_with_culture(
 )
 async def chat_general(
     payload: ChatRequest,
+    request: Request,
+    response: Response,
 ):
-    system_prompt = (
-        "You are a helpful assistant for the Culturology website. "
-        "Feel free to answer any questions about indigenous cultures, "
-        "their traditions, languages, history and how the site works."
-    )
+    bypass = bypass_requested(request.headers)
+    if not bypass:
+        cached = answer_cache.get(None, payload.question)
+        if cached is not None:
+            response.headers["X-Chat-Cache"] = "hit"
+            return ChatResponse(answer=cached)
+
+    messages = await asyncio.to_thread(general_messages, payload.question)
     try:
-        resp = await openai.ChatCompletion.acreate(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": payload.question},
-            ],
-            temperature=0.7,
-            max_tokens=500,
-        )
-    except Exception as e:
+        async with await admission.admit(request):
+            resp = await llm_flight.do(
+                ("chat", None, normalize_prompt(payload.question)),
+                lambda: get_llm().chat(messages, temperature=0.7, max_tokens=500),
+            )
+    except LLMError as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"OpenAI API error: {e}"
         )
 
-    answer = resp.choices[0].message.content.strip()
-    return ChatResponse(answer=answer)
+    answer_cache.set(None, payload.question, resp.content)
+    response.headers["X-Chat-Cache"] = "bypass" if bypass else "miss"
+    return ChatResponse(answer=resp.content)
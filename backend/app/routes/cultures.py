@@ -1,71 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from types import SimpleNamespace
+from typing import Literal, Union
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, distinct
+from sqlalchemy import distinct, func
 
-from ..database.session import get_db
+from ..database.replicas import mark_write
+from ..database.session import get_async_db, get_db, get_read_db, replicas
 from ..models.culture import Culture
 from ..models.culture_image import CultureImage
-from ..schemas.culture import CultureCreate, CultureUpdate, CultureOut
+from ..schemas.culture import (
+    CultureCard, CultureCreate, CultureFields, CultureUpdate, CultureOut, CultureSuggestion,
+    Image, ImageOut, ImagePatch,
+)
+from ..schemas.geo import GeoNearby, GeoViewport
+from ..schemas.pagination import Page
+from ..utils.pagination import MAX_PAGE_SIZE, keyset_page
+from ..utils.bulk import export_ndjson, import_ndjson
+from ..utils.cache import response_cache
+from ..utils.chat_cache import answer_cache
+from ..utils.culture_views import culture_query, listing_query, parse_fields, shape_rows
+from ..utils.gallery import apply_gallery, move_image
+from ..utils.geo import geo_index, parse_bbox
+from ..utils.index_sync import index_sync
+from ..utils.quiz_bank import content_hash, quiz_bank_worker
+from ..utils.search import apply_search
+from ..utils.serialization import TrustedJSONResponse
+from ..utils.snapshot import snapshot_worker
+from ..utils.retrieval import vector_index
+from ..utils.suggest import suggest_index
 
 router = APIRouter()
 
+LIST_GROUP = "cultures:list"
+REGIONS_GROUP = "cultures:regions"
+
+
+def invalidate_cultures(*slugs: str):
+    groups = (LIST_GROUP, REGIONS_GROUP, *(f"culture:{s}" for s in slugs))
+    response_cache.invalidate(*groups)
+    # entries other clients refill from a replica that is still behind
+    replicas.after_catch_up(response_cache.invalidate, *groups)
+    for slug in slugs:
+        answer_cache.invalidate(slug)
+    snapshot_worker.schedule()
+
+
+def culture_changed(culture, old_slug: str | None = None):
+    """Post-commit hook: keep in-memory indexes and caches in step with a write."""
+    suggest_index.upsert(culture, old_slug=old_slug)
+    geo_index.upsert(culture, old_slug=old_slug)
+    vector_index.upsert(culture, old_slug=old_slug)
+    index_sync.bump()
+    invalidate_cultures(*{old_slug or culture.slug, culture.slug})
+
+
 @router.get("/regions", response_model=list[str], tags=["cultures"])
-def list_regions(db: Session = Depends(get_db)):
-    
-    rows = (
-        db
-        .query(distinct(Culture.region))
-        .filter(Culture.region.isnot(None))
-        .all()
-    )
-    
-    return [r[0] for r in rows]
+def list_regions(request: Request, db: Session = Depends(get_read_db)):
+    def build():
+        rows = (
+            db
+            .query(distinct(Culture.region))
+            .filter(Culture.region.isnot(None))
+            .all()
+        )
+        return [r[0] for r in rows]
+
+    return response_cache.respond(request, response_cache.key(REGIONS_GROUP), build)
 
-@router.get("/search", response_model=list[CultureOut])
+VIEW_QUERY = Query("full", description="`card` returns the slim CultureCard shape")
+FIELDS_QUERY = Query(
+    None,
+    description="Comma-separated subset of fields (id, slug and name are always included)",
+)
+
+# view=full, view=card and fields= responses, each as a page (cursor) or a plain list
+CultureListing = Union[
+    Page[CultureOut], list[CultureOut],
+    Page[CultureCard], list[CultureCard],
+    Page[CultureFields], list[CultureFields],
+]
+
+
+def listing_payload(items, next_cursor=None, paged=False, columns=None):
+    if columns is None:
+        items = [CultureOut.from_orm(i) for i in items]
+    return {"items": items, "next_cursor": next_cursor} if paged else items
+
+
+@router.get("/search", response_model=CultureListing)
 def search_cultures(
     query: str | None = Query(
         None,
         min_length=1,
-        description="Search term across name, region, location, language, etc.",
+        description="Full-text search across name, region, language and texts (prefix match, ranked)",
     ),
     region: str | None = Query(None, description="Filter by region"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1),
-    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="Keyset cursor; pass an empty value for the first page"),
+    view: Literal["full", "card"] = VIEW_QUERY,
+    fields: str | None = FIELDS_QUERY,
+    db: Session = Depends(get_read_db),
 ):
-    q = db.query(Culture)
-
-    
-    if query:
-        term = f"%{query.lower()}%"
-        q = q.filter(
-            or_(
-                Culture.name.ilike(term),
-                Culture.slug.ilike(term),
-                Culture.region.ilike(term),
-                Culture.location.ilike(term),
-                Culture.language.ilike(term),
-                Culture.about.ilike(term),
-                Culture.traditions.ilike(term),
-                Culture.lifestyle.ilike(term),
-            )
-        )
+    columns = parse_fields(view, fields)
+    q = listing_query(db, columns)
 
-   
     if region:
         reg = f"%{region.lower()}%"
         q = q.filter(Culture.region.ilike(reg))
 
- 
-    results = q.offset(skip).limit(limit).all()
-    return results
+    if query:
+        q, rank = apply_search(q, db, query)
+        order = [(rank, True), (Culture.id, False)]
+    else:
+        order = [(Culture.name, False), (Culture.id, False)]
+
+    if cursor is None:
+        q = q.order_by(*(col.desc() if desc else col for col, desc in order))
+        rows = q.offset(skip).limit(limit).all()
+        return TrustedJSONResponse(listing_payload(shape_rows(db, rows, columns), columns=columns))
+
+    if query:
+        rows, next_cursor = keyset_page(
+            q.add_columns(rank.label("rank")), order, cursor, limit,
+            key=lambda row: [row.rank, row.Culture.id if columns is None else row.id],
+        )
+        rows = [row.Culture if columns is None else row for row in rows]
+    else:
+        rows, next_cursor = keyset_page(q, order, cursor, limit)
+    return TrustedJSONResponse(listing_payload(shape_rows(db, rows, columns), next_cursor, True, columns))
+
+
+@router.get("/suggest", response_model=list[CultureSuggestion])
+def suggest_cultures(
+    q: str = Query(..., min_length=1, max_length=64, description="Prefix typed so far"),
+    limit: int = Query(8, ge=1, le=20),
+):
+    # served from the in-memory index, no DB round trip
+    return suggest_index.suggest(q, limit)
+
+
+@router.get("/geo", response_model=GeoViewport)
+def cultures_in_viewport(
+    bbox: str = Query(
+        "-180,-90,180,90",
+        description="min_lon,min_lat,max_lon,max_lat (min_lon > max_lon crosses the antimeridian)",
+    ),
+    zoom: int = Query(2, ge=0, le=22, description="Map zoom; low zooms are clustered server-side"),
+):
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return geo_index.viewport(box, zoom)
+
+
+@router.get("/geo/nearest", response_model=list[GeoNearby])
+def nearest_cultures(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    n: int = Query(5, ge=1, le=50),
+):
+    return geo_index.nearest(lat, lon, n)
+
+
+@router.post(
+    "/bulk",
+    summary="Bulk upsert cultures from NDJSON (one CultureCreate per line)",
+    dependencies=[Depends(mark_write)],
+)
+async def bulk_import(request: Request, db: AsyncSession = Depends(get_async_db)):
+    def on_batch(items, ids):
+        rows = [SimpleNamespace(**item.dict(exclude={"gallery"})) for item in items]
+        for row in rows:
+            suggest_index.upsert(row)
+            geo_index.upsert(row)
+        vector_index.upsert_many(rows)
+        index_sync.bump()
+        invalidate_cultures(*ids)
+        for culture_id in ids.values():
+            quiz_bank_worker.enqueue(culture_id)
+
+    return await import_ndjson(db, request.stream(), on_batch)
+
+
+@router.get("/export", summary="Stream the whole catalog as NDJSON")
+def export_cultures():
+    return StreamingResponse(
+        export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="cultures.ndjson"'},
+    )
 
 
 def create_images(db: Session, culture: Culture, images):
-    for img in images:
-        db.add(CultureImage(culture_id=culture.id, **img.dict()))
+    for position, img in enumerate(images):
+        db.add(CultureImage(culture_id=culture.id, position=position, **img.dict()))
 
-@router.post("/", response_model=CultureOut, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=CultureOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(mark_write)],
+)
 def create_culture(payload: CultureCreate, db: Session = Depends(get_db)):
     if db.query(Culture).filter(Culture.slug == payload.slug).first():
         raise HTTPException(409, "Slug already exists")
@@ -75,20 +215,46 @@ def create_culture(payload: CultureCreate, db: Session = Depends(get_db)):
     create_images(db, culture, payload.gallery)
     db.commit()
     db.refresh(culture)
+    culture_changed(culture)
+    quiz_bank_worker.enqueue(culture.id)
     return culture
 
-@router.get("/", response_model=list[CultureOut])
-def list_cultures(skip: int = 0, limit: int = 12, db: Session = Depends(get_db)):
-    return db.query(Culture).offset(skip).limit(limit).all()
+@router.get("/", response_model=CultureListing)
+def list_cultures(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(12, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="Keyset cursor; pass an empty value for the first page"),
+    view: Literal["full", "card"] = VIEW_QUERY,
+    fields: str | None = FIELDS_QUERY,
+    db: Session = Depends(get_read_db),
+):
+    columns = parse_fields(view, fields)
+
+    def build():
+        q = listing_query(db, columns)
+        if cursor is None:
+            rows = q.order_by(Culture.name, Culture.id).offset(skip).limit(limit).all()
+            return listing_payload(shape_rows(db, rows, columns), columns=columns)
+        rows, next_cursor = keyset_page(
+            q, [(Culture.name, False), (Culture.id, False)], cursor, limit
+        )
+        return listing_payload(shape_rows(db, rows, columns), next_cursor, True, columns)
+
+    key = response_cache.key(LIST_GROUP, skip, limit, cursor, view, columns)
+    return response_cache.respond(request, key, build)
 
 @router.get("/{slug}", response_model=CultureOut)
-def get_by_slug(slug: str, db: Session = Depends(get_db)):
-    culture = db.query(Culture).filter(Culture.slug == slug).first()
-    if not culture:
-        raise HTTPException(404, "Culture not found")
-    return culture
+def get_by_slug(slug: str, request: Request, db: Session = Depends(get_read_db)):
+    def build():
+        culture = culture_query(db).filter(Culture.slug == slug).first()
+        if not culture:
+            raise HTTPException(404, "Culture not found")
+        return CultureOut.from_orm(culture)
+
+    return response_cache.respond(request, response_cache.key(f"culture:{slug}"), build)
 
-@router.put("/{slug}", response_model=CultureOut)
+@router.put("/{slug}", response_model=CultureOut, dependencies=[Depends(mark_write)])
 def update_culture(
     slug: str,
     payload: CultureUpdate,
@@ -97,24 +263,111 @@ def update_culture(
     culture = db.query(Culture).filter(Culture.slug == slug).first()
     if not culture:
         raise HTTPException(404, "Culture not found")
+    old_hash = content_hash(culture)
 
     for k, v in payload.dict(exclude_unset=True, exclude={"gallery"}).items():
         setattr(culture, k, v)
 
     if payload.gallery is not None:
-        db.query(CultureImage).filter(CultureImage.culture_id == culture.id).delete()
-        create_images(db, culture, payload.gallery)
+        apply_gallery(db, culture.id, [img.dict() for img in payload.gallery])
 
     db.commit()
     db.refresh(culture)
+    culture_changed(culture, old_slug=slug)
+    if content_hash(culture) != old_hash:
+        quiz_bank_worker.enqueue(culture.id)
     return culture
 
-@router.delete("/{slug}", status_code=204)
+@router.delete("/{slug}", status_code=204, dependencies=[Depends(mark_write)])
 def delete_culture(slug: str, db: Session = Depends(get_db)):
     culture = db.query(Culture).filter(Culture.slug == slug).first()
     if not culture:
         raise HTTPException(404, "Culture not found")
     db.delete(culture)
     db.commit()
+    suggest_index.remove(slug)
+    geo_index.remove(slug)
+    vector_index.remove(slug)
+    index_sync.bump()
+    invalidate_cultures(slug)
+
+
+def get_culture_image(db: Session, slug: str, image_id: int):
+    culture = db.query(Culture).filter(Culture.slug == slug).first()
+    if not culture:
+        raise HTTPException(404, "Culture not found")
+    image = (
+        db.query(CultureImage)
+        .filter(CultureImage.id == image_id, CultureImage.culture_id == culture.id)
+        .first()
+    )
+    if not image:
+        raise HTTPException(404, "Image not found")
+    return culture, image
+
+
+@router.post(
+    "/{slug}/gallery",
+    response_model=ImageOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(mark_write)],
+)
+def add_image(
+    slug: str,
+    payload: Image,
+    position: int | None = Query(None, ge=0, description="Insert at this place (default: append)"),
+    db: Session = Depends(get_db),
+):
+    culture = db.query(Culture).filter(Culture.slug == slug).first()
+    if not culture:
+        raise HTTPException(404, "Culture not found")
+    last = (
+        db.query(func.max(CultureImage.position))
+        .filter(CultureImage.culture_id == culture.id)
+        .scalar()
+    )
+    image = CultureImage(
+        culture_id=culture.id, position=-1 if last is None else last + 1, **payload.dict()
+    )
+    db.add(image)
+    db.flush()
+    move_image(db, culture.id, image.id, image.position if position is None else position)
+    db.commit()
+    db.refresh(image)
+    invalidate_cultures(slug)
+    return image
 
 
+@router.patch("/{slug}/gallery/{image_id}", response_model=ImageOut, dependencies=[Depends(mark_write)])
+def patch_image(
+    slug: str,
+    image_id: int,
+    payload: ImagePatch,
+    db: Session = Depends(get_db),
+):
+    culture, image = get_culture_image(db, slug, image_id)
+    changes = payload.dict(exclude_unset=True)
+    if "url" in changes and changes["url"] is None:
+        raise HTTPException(422, "url cannot be null")
+    for field in ("url", "caption"):
+        if field in changes:
+            setattr(image, field, changes[field])
+    db.flush()
+    if changes.get("position") is not None:
+        move_image(db, culture.id, image.id, changes["position"])
+    db.commit()
+    db.refresh(image)
+    invalidate_cultures(slug)
+    return image
+
+
+@router.delete(
+    "/{slug}/gallery/{image_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(mark_write)],
+)
+def delete_image(slug: str, image_id: int, db: Session = Depends(get_db)):
+    _, image = get_culture_image(db, slug, image_id)
+    db.delete(image)
+    db.commit()
+    invalidate_cultures(slug)
@@ -0,0 +1,76 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.session import get_async_db
+from ..models.culture_image import CultureImage
+from ..models.media_item import MediaItem
+from ..utils.cache import etag_matches
+from ..utils.images import ImageError, image_service, snap_width, source_version
+
+router = APIRouter(prefix="/api/images", tags=["images"])
+
+WIDTH_QUERY = Query(None, ge=1, le=4096, description="Wanted width in px, rounded up to the nearest variant")
+FORMAT_QUERY = Query(None, description="Defaults to webp when the Accept header allows it, else jpeg")
+VERSION_QUERY = Query(None, description="Source version from the srcset url; makes the response immutable")
+
+
+async def serve_variant(
+    request: Request, url: str, w: Optional[int], fmt: Optional[str], v: Optional[str]
+) -> Response:
+    headers = {}
+    if fmt is None:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        headers["Vary"] = "Accept"
+    try:
+        variant = await image_service.derivative(url, snap_width(w), fmt)
+    except ImageError as e:
+        raise HTTPException(e.status_code, e.detail)
+
+    # only a url pinned to the current original may be cached forever;
+    # unversioned or stale links revalidate
+    if v == source_version(url):
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "public, max-age=300, must-revalidate"
+    headers["ETag"] = variant.etag
+    if etag_matches(request.headers.get("if-none-match"), variant.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(variant.path, media_type=variant.media_type, headers=headers)
+
+
+@router.get("/media/{item_id}", summary="Уменьшенная обложка медиа-объекта")
+async def media_thumbnail(
+    item_id: int,
+    request: Request,
+    w: Optional[int] = WIDTH_QUERY,
+    fmt: Optional[Literal["webp", "jpeg"]] = FORMAT_QUERY,
+    v: Optional[str] = VERSION_QUERY,
+    db: AsyncSession = Depends(get_async_db),
+):
+    item = await db.get(MediaItem, item_id)
+    if not item or not item.thumbnail:
+        raise HTTPException(404, "Thumbnail not found")
+    url = item.thumbnail
+    await db.close()
+    return await serve_variant(request, url, w, fmt, v)
+
+
+@router.get("/{image_id}", summary="Уменьшенная копия изображения галереи")
+async def gallery_image(
+    image_id: int,
+    request: Request,
+    w: Optional[int] = WIDTH_QUERY,
+    fmt: Optional[Literal["webp", "jpeg"]] = FORMAT_QUERY,
+    v: Optional[str] = VERSION_QUERY,
+    db: AsyncSession = Depends(get_async_db),
+):
+    image = await db.get(CultureImage, image_id)
+    if not image:
+        raise HTTPException(404, "Image not found")
+    url = image.url
+    # don't hold a pooled connection while the variant is fetched/rendered
+    await db.close()
+    return await serve_variant(request, url, w, fmt, v)
@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import mimetypes
+from pathlib import PurePath
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from pydantic import HttpUrl
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 
-from ..database.session import get_db
+from ..database.replicas import mark_write
+from ..database.session import get_async_db, get_db, get_read_db
 from ..models.media_item import MediaItem as MediaItemModel
 from ..schemas.media import MediaItemCreate, MediaItemOut
+from ..schemas.pagination import Page
+from ..utils.media_files import MediaTooLarge, media_response, probe_duration, remove_file, store_upload
+from ..utils.pagination import MAX_PAGE_SIZE, keyset_page
+from ..utils.serialization import TrustedJSONResponse, orm_response
+from ..utils.snapshot import snapshot_worker
 
 router = APIRouter(prefix="/api/media", tags=["media"])
 
@@ -13,6 +25,7 @@ router = APIRouter(prefix="/api/media", tags=["media"])
     response_model=MediaItemOut,
     status_code=status.HTTP_201_CREATED,
     summary="Создать новый медиа-объект",
+    dependencies=[Depends(mark_write)],
 )
 def create_media(
     payload: MediaItemCreate,
@@ -30,23 +43,98 @@ def create_media(
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    snapshot_worker.schedule()
     return db_item
 
-@router.get("/", response_model=List[MediaItemOut])
-def list_media(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    return db.query(MediaItemModel).offset(skip).limit(limit).all()
+@router.post(
+    "/upload",
+    response_model=MediaItemOut,
+    status_code=status.HTTP_201_CREATED,
+    summary="Загрузить видео/аудио для хостинга на сервере",
+    dependencies=[Depends(mark_write)],
+)
+async def upload_media(
+    request: Request,
+    type: Literal["video", "audio"] = Query(..., description="Тип медиа"),
+    filename: str = Query(..., description="Имя исходного файла (нужно расширение)"),
+    caption: Optional[str] = Query(None),
+    thumbnail: Optional[HttpUrl] = Query(None),
+    subtitles_url: Optional[HttpUrl] = Query(None),
+    duration: Optional[int] = Query(None, ge=0, description="Если не указана, определяется по файлу"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The request body is the raw file; it is streamed to disk, never buffered."""
+    mime_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if not mime_type or mime_type == "application/octet-stream":
+        mime_type = mimetypes.guess_type(filename)[0] or ""
+    if not mime_type.startswith(f"{type}/"):
+        raise HTTPException(415, f"Expected a {type}/* file, got {mime_type or 'unknown type'}")
+
+    try:
+        file_path, size = await store_upload(request.stream(), PurePath(filename).suffix)
+    except MediaTooLarge:
+        raise HTTPException(413, "File is too large")
+    if duration is None:
+        duration = await asyncio.to_thread(probe_duration, file_path)
+
+    item = MediaItemModel(
+        type=type,
+        url="",
+        thumbnail=str(thumbnail) if thumbnail else None,
+        caption=caption,
+        subtitles_url=str(subtitles_url) if subtitles_url else None,
+        duration=duration,
+        file_path=file_path,
+        size=size,
+        mime_type=mime_type,
+    )
+    db.add(item)
+    await db.flush()
+    item.url = f"/api/media/{item.id}/stream"
+    await db.commit()
+    snapshot_worker.schedule()
+    return item
+
+@router.get("/{item_id}/stream", summary="Стриминг загруженного файла (Range)")
+@router.head("/{item_id}/stream", include_in_schema=False)
+def stream_media(item_id: int, db: Session = Depends(get_read_db)):
+    item = db.query(MediaItemModel).get(item_id)
+    if not item or not item.file_path:
+        raise HTTPException(status_code=404, detail="Media file not found")
+    try:
+        return media_response(item.file_path, item.mime_type)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Media file not found")
+
+@router.get("/", response_model=Union[Page[MediaItemOut], List[MediaItemOut]])
+def list_media(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Keyset cursor; pass an empty value for the first page"),
+    db: Session = Depends(get_read_db),
+):
+    q = db.query(MediaItemModel)
+    if cursor is None:
+        return orm_response(MediaItemOut, q.order_by(MediaItemModel.id).offset(skip).limit(limit).all())
+    items, next_cursor = keyset_page(q, [(MediaItemModel.id, False)], cursor, limit)
+    return TrustedJSONResponse(Page[MediaItemOut](items=items, next_cursor=next_cursor))
 
 @router.get("/{item_id}", response_model=MediaItemOut)
-def get_media(item_id: int, db: Session = Depends(get_db)):
+def get_media(item_id: int, db: Session = Depends(get_read_db)):
     item = db.query(MediaItemModel).get(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Media item not found")
-    return item
+    return orm_response(MediaItemOut, item)
 
-@router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(mark_write)])
 def delete_media(item_id: int, db: Session = Depends(get_db)):
     item = db.query(MediaItemModel).get(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Media item not found")
+    file_path = item.file_path
     db.delete(item)
     db.commit()
+    snapshot_worker.schedule()
+    # uploads are content-addressed, so another item may share the file
+    if file_path and not db.query(MediaItemModel.id).filter(MediaItemModel.file_path == file_path).first():
+        remove_file(file_path)
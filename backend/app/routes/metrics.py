@@ -0,0 +1,39 @@
+"""
+Prometheus metrics and slow-request profiles. Both are kept per worker
+process: with several uvicorn workers a scrape sees whichever worker
+answered, so run one worker per scraped port (or one scrape target per
+worker) when the numbers have to add up.
+"""
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from ..config import settings
+from ..utils.metrics import profiler, registry
+
+LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+
+def metrics_access(request: Request):
+    """METRICS_TOKEN as a bearer token when set, else loopback clients only."""
+    if settings.metrics_token:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token, settings.metrics_token):
+            raise HTTPException(401, "Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    elif request.client is None or request.client.host not in LOOPBACK:
+        raise HTTPException(404, "Not Found")
+
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(metrics_access)])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/slow", include_in_schema=False)
+def slow_requests():
+    """Latest slow-request profiles (empty unless PROFILE_SLOW_MS is set)."""
+    return list(profiler.reports)
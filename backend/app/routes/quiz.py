@@ -1,21 +1,23 @@
-import os
-import json
 import random
-from dotenv import load_dotenv
-import openai
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Union
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..database.session import get_db
+from ..database.session import get_async_db, get_db, get_read_db
 from ..models.culture import Culture
 from ..models.quiz import Quiz
-from ..schemas.quiz import QuizCreate, QuizUpdate, QuizOut, QuizItem
-load_dotenv()
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_KEY:
-    raise RuntimeError("OPENAI_API_KEY not set in .env")
-openai.api_key = OPENAI_KEY
-
+from ..models.quiz_job import QuizJob
+from ..schemas.quiz import QuizCreate, QuizUpdate, QuizOut, QuizItem, QuizBatchRequest, QuizJobOut
+from ..schemas.pagination import Page
+from ..utils.quiz_bank import content_hash, generate_and_store, pick_warm_set, quiz_bank_worker
+from ..utils.quiz_batch import quiz_batch_runner
+from ..utils.metrics import quiz_generations
+from ..utils.singleflight import llm_flight
+from ..utils.pagination import MAX_PAGE_SIZE, keyset_page
+from ..utils.admission import admission
+from ..utils.serialization import TrustedJSONResponse, orm_response
 
 router = APIRouter(prefix="/api/quiz", tags=["quiz"])
 
@@ -27,18 +29,22 @@ STATIC_TEMPLATES = [
     ("Describe the typical lifestyle of the {name} people.", "lifestyle"),
 ]
 
-@router.get("/", response_model=list[QuizOut])
+@router.get("/", response_model=Union[Page[QuizOut], list[QuizOut]])
 def read_quizzes(
     culture_id: int | None = Query(None, alias="culture_id", description="Filter by culture ID"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1),
-    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="Keyset cursor; pass an empty value for the first page"),
+    db: Session = Depends(get_read_db),
 ):
    
     q = db.query(Quiz)
     if culture_id is not None:
         q = q.filter(Quiz.culture_id == culture_id)
-    return q.offset(skip).limit(limit).all()
+    if cursor is None:
+        return orm_response(QuizOut, q.order_by(Quiz.id).offset(skip).limit(limit).all())
+    items, next_cursor = keyset_page(q, [(Quiz.id, False)], cursor, limit)
+    return TrustedJSONResponse(Page[QuizOut](items=items, next_cursor=next_cursor))
 
 @router.post("/", response_model=QuizOut, status_code=status.HTTP_201_CREATED)
 def create_quiz(
@@ -77,46 +83,88 @@ def delete_quiz(
     db.delete(quiz)
     db.commit()
 
+@router.post(
+    "/batch",
+    response_model=QuizJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Пакетная генерация квизов для нескольких культур",
+)
+async def start_quiz_batch(
+    payload: QuizBatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+):
+    job = await quiz_batch_runner.create(db, payload.slugs, payload.stale)
+    if job.slugs:
+        quiz_batch_runner.start(job.id)
+    return QuizJobOut.from_job(job)
+
+@router.get("/batch/{job_id}", response_model=QuizJobOut, summary="Прогресс пакетной генерации")
+async def get_quiz_batch(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+):
+    job = await db.get(QuizJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return QuizJobOut.from_job(job)
+
+@router.post(
+    "/batch/{job_id}/resume",
+    response_model=QuizJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Продолжить пакетную генерацию с незавершённых культур",
+)
+async def resume_quiz_batch(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+):
+    job = await db.get(QuizJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if quiz_batch_runner.running(job_id) or quiz_batch_runner.leased(job):
+        raise HTTPException(status_code=409, detail="Job is already running")
+    if len(job.done) == len(job.slugs):
+        raise HTTPException(status_code=409, detail="Job has nothing left to do")
+    quiz_batch_runner.start(job_id)
+    return QuizJobOut.from_job(job)
+
 @router.post("/generate/{slug}", response_model=list[QuizItem])
 async def generate_quiz(
     slug: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ):
    
-    culture = db.query(Culture).filter(Culture.slug == slug).first()
+    culture = (
+        await db.execute(select(Culture).where(Culture.slug == slug))
+    ).scalars().first()
     if not culture:
         raise HTTPException(status_code=404, detail="Culture not found")
 
-    prompt_text = (
-        f"Generate 5 multiple choice questions (4 options each) based on:\n"
-        f"Name: {culture.name}\n"
-        f"Region: {culture.region or ''}\n"
-        f"Location: {culture.location or ''}\n"
-        f"Population: {culture.population or ''}\n"
-        f"Language: {culture.language or ''}\n"
-        f"About: {culture.about or ''}\n"
-        f"Traditions: {culture.traditions or ''}\n"
-        f"Lifestyle: {culture.lifestyle or ''}\n"
-        "Return JSON: { \"questions\": [ { \"id\":1, \"question\":\"...\", \"options\":{A:\"..\",B:\"..\",C:\"..\",D:\"..\"}, \"correct\":\"A\" }, ... ] }"
-    )
+    digest = content_hash(culture)
+    items = await pick_warm_set(db, culture.id, digest)
+    if items is not None:
+        quiz_generations.inc("warm")
+        return items
 
+    # cold miss: generate inline, keep the set and let the worker fill the rest
+    await db.close()
+    ticket = await admission.admit(request)
     try:
-        resp = await openai.ChatCompletion.acreate(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful quiz generator."},
-                {"role": "user", "content": prompt_text},
-            ],
-            temperature=0.7,
-            max_tokens=800,
+        # concurrent cold misses for the same text share one upstream call
+        items = await llm_flight.do(
+            ("quiz", culture.slug, digest),
+            lambda: generate_and_store(culture, digest),
         )
-        text = resp.choices[0].message.content.strip()
-        payload = json.loads(text)
-        return payload.get("questions", [])
+        quiz_generations.inc("generated")
+        return items
     except Exception as e:
         print("Quiz generation failed, fallback to static:", e)
+    finally:
+        await ticket.release()
+        quiz_bank_worker.enqueue(culture.id)
 
-    
+    quiz_generations.inc("fallback")
     items: list[QuizItem] = []
     sample = random.sample(STATIC_TEMPLATES, k=5)
     for idx, (tpl, field) in enumerate(sample, start=1):
@@ -1,5 +1,7 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Extra, Field, root_validator
+
+from ..utils.images import image_variants
 
 class Image(BaseModel):
     url: str
@@ -9,6 +11,24 @@ class Image(BaseModel):
         orm_mode = True
 
 
+class ImageOut(Image):
+    id: int
+    position: int = 0
+    src: Optional[str] = Field(None, description="Resized JPEG for clients without srcset")
+    srcset: Optional[str] = Field(None, description="WebP variants for <img srcset>")
+
+    @root_validator(skip_on_failure=True)
+    def add_variants(cls, values):
+        values.update(image_variants(values["id"], values["url"]))
+        return values
+
+
+class ImagePatch(BaseModel):
+    url: Optional[str] = None
+    caption: Optional[str] = None
+    position: Optional[int] = Field(None, ge=0, description="New 0-based place in the gallery")
+
+
 class CultureBase(BaseModel):
     name: str = Field(
         ...,
@@ -33,6 +53,8 @@ class CultureBase(BaseModel):
     about: Optional[str] = Field(None, description="General overview text")
     traditions: Optional[str] = Field(None, description="Traditions description")
     lifestyle: Optional[str] = Field(None, description="Lifestyle description")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Map latitude")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Map longitude")
     gallery: List[Image] = []
 
     class Config:
@@ -53,6 +75,8 @@ class CultureUpdate(BaseModel):
     about: Optional[str] = None
     traditions: Optional[str] = None
     lifestyle: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     gallery: Optional[List[Image]] = None
 
     class Config:
@@ -61,3 +85,36 @@ class CultureUpdate(BaseModel):
 
 class CultureOut(CultureBase):
     id: int
+    gallery: List[ImageOut] = []
+
+
+class CultureCard(BaseModel):
+    """Slim listing shape: no long texts, only the first gallery image."""
+    id: int
+    slug: str
+    name: str
+    region: Optional[str] = None
+    location: Optional[str] = None
+    population: Optional[int] = None
+    language: Optional[str] = None
+    cover: Optional[str] = None
+    cover_srcset: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class CultureFields(BaseModel):
+    """Sparse listing shape (?fields=): the key fields plus the requested ones."""
+    id: int
+    slug: str
+    name: str
+
+    class Config:
+        extra = Extra.allow
+
+
+class CultureSuggestion(BaseModel):
+    slug: str
+    name: str
+    region: Optional[str] = None
@@ -0,0 +1,20 @@
+from typing import List
+from pydantic import BaseModel, Field
+
+class GeoPoint(BaseModel):
+    slug: str
+    name: str
+    lat: float
+    lon: float
+
+class GeoCluster(BaseModel):
+    lat: float = Field(..., description="Centroid latitude")
+    lon: float = Field(..., description="Centroid longitude")
+    count: int
+
+class GeoViewport(BaseModel):
+    points: List[GeoPoint]
+    clusters: List[GeoCluster]
+
+class GeoNearby(GeoPoint):
+    distance_km: float
@@ -1,5 +1,7 @@
 from typing import Literal, Optional
-from pydantic import BaseModel, HttpUrl, Field
+from pydantic import BaseModel, HttpUrl, Field, root_validator
+
+from ..utils.images import image_variants
 
 class MediaItemBase(BaseModel):
     type: Literal["video", "audio"] = Field(..., description="Тип медиа")
@@ -14,6 +16,18 @@ class MediaItemCreate(MediaItemBase):
 
 class MediaItemOut(MediaItemBase):
     id: int = Field(..., description="ID медиа-объекта")
+    url: str = Field(..., description="URL видео или аудио (для своих файлов — /api/media/{id}/stream)")
+    size: Optional[int] = Field(None, description="Размер файла в байтах (для своих файлов)")
+    mime_type: Optional[str] = Field(None, description="MIME-тип файла (для своих файлов)")
+    thumbnail_src: Optional[str] = Field(None, description="Уменьшенное превью (JPEG)")
+    thumbnail_srcset: Optional[str] = Field(None, description="Варианты превью в WebP для srcset")
+
+    @root_validator(skip_on_failure=True)
+    def add_thumbnail_variants(cls, values):
+        if values.get("thumbnail"):
+            variants = image_variants(values["id"], str(values["thumbnail"]), prefix="/api/images/media")
+            values["thumbnail_src"], values["thumbnail_srcset"] = variants["src"], variants["srcset"]
+        return values
 
     class Config:
         orm_mode = True
@@ -0,0 +1,13 @@
+from typing import Generic, List, Optional, TypeVar
+from pydantic import Field
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class Page(GenericModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Pass back as `cursor` to get the next page; null on the last page",
+    )
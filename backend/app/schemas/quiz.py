@@ -1,6 +1,7 @@
-from typing import Literal, Dict
+from datetime import datetime
+from typing import Literal, Dict, List
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 
 class QuizBase(BaseModel):
     culture_id: int = Field(..., description="ID of the related culture")
@@ -33,3 +34,31 @@ class QuizItem(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class QuizBatchRequest(BaseModel):
+    slugs: Optional[List[str]] = Field(None, description="Культуры для генерации")
+    stale: bool                = Field(False, description="Все культуры без набора для текущего текста")
+
+    @root_validator
+    def one_target(cls, values):
+        if not values.get("slugs") and not values.get("stale"):
+            raise ValueError("pass slugs or stale=true")
+        return values
+
+
+class QuizJobOut(BaseModel):
+    id:         int
+    status:     str
+    total:      int
+    completed:  int
+    failed:     Dict[str, str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_job(cls, job):
+        return cls(
+            id=job.id, status=job.status, total=len(job.slugs), completed=len(job.done),
+            failed=job.failed, created_at=job.created_at, updated_at=job.updated_at,
+        )
@@ -0,0 +1,295 @@
+"""
+Admission control for the LLM-backed endpoints.
+
+A request needing an upstream call must pass, in order: a per-client
+token bucket (429), a global token bucket (503), and a slot in its
+pool's concurrency limit. When the pool is full it waits in a bounded
+FIFO queue until its deadline; a full queue or an expired deadline is
+a 503. Every rejection carries Retry-After.
+
+Buckets and slots live in a pluggable backend: `memory://` is local to
+one worker, `redis://` shares the limits across all uvicorn workers.
+Slots in redis are leases, so a crashed worker can't hold them forever.
+
+Only the LLM routes are admission-controlled; catalog reads are neither
+limited nor given priority here.
+"""
+import asyncio
+import math
+import threading
+import time
+import uuid
+from collections import deque
+
+import anyio
+
+from fastapi import HTTPException, Request
+
+from ..config import settings
+from .metrics import admission_decisions, admission_queue, admission_wait
+
+# how often the head of a queue re-checks for slots freed by other workers
+POLL_INTERVAL = 0.05
+# how often the memory backend drops buckets that have refilled
+SWEEP_INTERVAL = 60
+
+
+class MemoryAdmissionBackend:
+    """Per-process state; the default, and the stand-in for tests."""
+
+    def __init__(self):
+        # key -> (tokens, stamp, when it is full again)
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+        self._slots: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def _sweep(self, now: float):
+        # a refilled bucket is the same as a missing one, so one per client
+        # seen doesn't have to be kept forever
+        self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+        self._swept = now
+
+    async def take(self, buckets: list[tuple[str, float, float]]) -> tuple[int, float]:
+        """
+        One token from each (key, rate, burst) bucket, or from none of them.
+        Returns (-1, 0) if granted, else the index of the first bucket that
+        is short and the seconds until it has a token again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept >= SWEEP_INTERVAL:
+                self._sweep(now)
+            levels = []
+            for i, (key, rate, burst) in enumerate(buckets):
+                tokens, stamp, _ = self._buckets.get(key, (burst, now, now))
+                tokens = min(burst, tokens + (now - stamp) * rate)
+                if tokens < 1:
+                    return i, (1 - tokens) / rate
+                levels.append(tokens)
+            for (key, rate, burst), tokens in zip(buckets, levels):
+                tokens -= 1
+                self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return -1, 0.0
+
+    async def acquire(self, key: str, token: str, limit: int, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            holders = self._slots.setdefault(key, {})
+            for held, expires in list(holders.items()):
+                if expires < now:
+                    del holders[held]
+            if len(holders) >= limit:
+                return False
+            holders[token] = now + ttl
+            return True
+
+    async def release(self, key: str, token: str):
+        with self._lock:
+            self._slots.get(key, {}).pop(token, None)
+
+
+_TAKE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+for i = 1, #KEYS do
+  local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', KEYS[i], 'tokens', 'stamp')
+  local tokens = tonumber(state[1]) or burst
+  local stamp = tonumber(state[2]) or now
+  tokens = math.min(burst, tokens + (now - stamp) * rate)
+  if tokens < 1 then return {i - 1, tostring((1 - tokens) / rate)} end
+  levels[i] = tokens
+end
+for i = 1, #KEYS do
+  local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+  redis.call('HSET', KEYS[i], 'tokens', levels[i] - 1, 'stamp', now)
+  redis.call('EXPIRE', KEYS[i], math.ceil(burst / rate) + 1)
+end
+return {-1, '0'}
+"""
+
+_ACQUIRE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then return 0 end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 1)
+return 1
+"""
+
+
+class RedisAdmissionBackend:
+    """Shared buckets and leased slots; each check is one atomic script call."""
+
+    def __init__(self, url: str, prefix: str = "adm:"):
+        import redis.asyncio as redis  # optional dependency, only needed for ADMISSION_URL=redis://
+
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE)
+        self._acquire = self._client.register_script(_ACQUIRE)
+        self.prefix = prefix
+
+    async def take(self, buckets: list[tuple[str, float, float]]) -> tuple[int, float]:
+        short, wait = await self._take(
+            keys=[self.prefix + key for key, _, _ in buckets],
+            args=[v for _, rate, burst in buckets for v in (rate, burst)],
+        )
+        return int(short), float(wait)
+
+    async def acquire(self, key: str, token: str, limit: int, ttl: float) -> bool:
+        return bool(await self._acquire(keys=[self.prefix + key], args=[limit, ttl, token]))
+
+    async def release(self, key: str, token: str):
+        await self._client.zrem(self.prefix + key, token)
+
+
+def make_backend(url: str | None = None):
+    url = url or settings.admission_url
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisAdmissionBackend(url)
+    return MemoryAdmissionBackend()
+
+
+def _retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionPool:
+    """
+    A concurrency limit (global when the backend is shared) with a bounded
+    per-worker FIFO of waiters. Only the head of the queue competes for a
+    freed slot, so waiters are admitted in arrival order.
+    """
+
+    def __init__(self, name: str, backend, limit: int, queue_size: int, timeout: float, lease: float):
+        self.name = name
+        self.backend = backend
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.lease = lease
+        self._queue: deque[asyncio.Event] = deque()
+        # moving average of how long a slot is held, for Retry-After hints
+        self._hold = 5.0
+
+    @property
+    def key(self) -> str:
+        return f"slots:{self.name}"
+
+    def _reject(self, outcome: str, detail: str) -> HTTPException:
+        admission_decisions.inc(self.name, outcome)
+        wait = self._hold * (len(self._queue) + 1) / self.limit
+        return HTTPException(503, detail, headers=_retry_after(wait))
+
+    async def acquire(self) -> str:
+        token = uuid.uuid4().hex
+        if not self._queue and await self.backend.acquire(self.key, token, self.limit, self.lease):
+            admission_decisions.inc(self.name, "admitted")
+            return token
+        if len(self._queue) >= self.queue_size:
+            raise self._reject("queue_full", "Server is busy, try again later")
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = asyncio.Event()
+        self._queue.append(entry)
+        admission_queue.inc(self.name)
+        try:
+            while True:
+                entry.clear()
+                if self._queue[0] is entry and await self.backend.acquire(self.key, token, self.limit, self.lease):
+                    admission_decisions.inc(self.name, "queued")
+                    admission_wait.observe(time.monotonic() - started, self.name)
+                    return token
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._reject("timeout", "Timed out waiting for capacity, try again later")
+                try:
+                    await asyncio.wait_for(entry.wait(), min(remaining, POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(entry)
+            admission_queue.dec(self.name)
+            if self._queue:
+                self._queue[0].set()
+
+    async def release(self, token: str, held: float):
+        self._hold = 0.8 * self._hold + 0.2 * held
+        await self.backend.release(self.key, token)
+        if self._queue:
+            self._queue[0].set()
+
+
+class Ticket:
+    """An admitted request's slot; release is idempotent."""
+
+    def __init__(self, pool: AdmissionPool, token: str):
+        self.pool = pool
+        self.token = token
+        self.started = time.monotonic()
+        self.released = False
+
+    async def release(self):
+        if self.released:
+            return
+        # called from a stream's finally, whose task is being cancelled when
+        # the client went away; the slot must still be given back
+        with anyio.CancelScope(shield=True):
+            await self.pool.release(self.token, time.monotonic() - self.started)
+        self.released = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+
+class AdmissionController:
+    def __init__(self, backend=None):
+        self.backend = backend or make_backend()
+        self.pools = {
+            "llm": AdmissionPool(
+                "llm", self.backend,
+                limit=settings.admission_llm_concurrency,
+                queue_size=settings.admission_llm_queue,
+                timeout=settings.admission_queue_timeout,
+                lease=settings.admission_lease_ttl,
+            ),
+        }
+        self.client_rate = settings.admission_client_rate
+        self.client_burst = settings.admission_client_burst
+        self.global_rate = settings.admission_global_rate
+        self.global_burst = settings.admission_global_burst
+
+    @staticmethod
+    def client_id(request: Request) -> str:
+        if settings.admission_trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def admit(self, request: Request, pool: str = "llm") -> Ticket:
+        """Raises 429/503 HTTPExceptions with Retry-After instead of admitting."""
+        # both buckets are checked before either is charged, so a request
+        # turned away by the global limit doesn't cost its client a token
+        short, wait = await self.backend.take([
+            (f"rate:{pool}:client:{self.client_id(request)}", self.client_rate, self.client_burst),
+            (f"rate:{pool}:global", self.global_rate, self.global_burst),
+        ])
+        if short == 0:
+            admission_decisions.inc(pool, "client_rate")
+            raise HTTPException(429, "Too many requests", headers=_retry_after(wait))
+        if short == 1:
+            admission_decisions.inc(pool, "global_rate")
+            raise HTTPException(503, "Server is busy, try again later", headers=_retry_after(wait))
+        target = self.pools[pool]
+        return Ticket(target, await target.acquire())
+
+
+admission = AdmissionController()
@@ -1,19 +1,15 @@
-import openai, os
-from dotenv import load_dotenv
-load_dotenv()
+from .llm import get_llm
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def ask_culture_bot(context: str, question: str) -> str:
+async def ask_culture_bot(context: str, question: str) -> str:
     prompt = (
         "You are a friendly representative of an indigenous culture. "
         "Use the context below to answer the user's question.\n\n"
         f"Context:\n{context}\n\nQuestion: {question}\nAnswer:"
     )
-    response = openai.Completion.create(
-        engine="text-davinci-003",
-        prompt=prompt,
+    resp = await get_llm().chat(
+        [{"role": "user", "content": prompt}],
         max_tokens=150,
         temperature=0.7,
     )
-    return response.choices[0].text.strip()
+    return resp.content
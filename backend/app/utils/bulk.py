@@ -0,0 +1,184 @@
+import asyncio
+import json
+from collections import defaultdict
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.session import SessionLocal
+from ..models.culture import Culture
+from ..models.culture_image import CultureImage
+from ..schemas.culture import CultureCreate
+from .gallery import diff_gallery, update_image
+
+BATCH_SIZE = settings.bulk_batch_size
+MAX_REPORTED_ERRORS = 1000
+COLUMNS = [f for f in CultureCreate.__fields__ if f != "gallery"]
+
+
+async def ndjson_lines(chunks):
+    """Split an async byte-chunk stream into (line_no, text) without buffering the body."""
+    buf = b""
+    line_no = 0
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            if raw.strip():
+                yield line_no, raw.decode("utf-8", errors="replace")
+    if buf.strip():
+        yield line_no + 1, buf.decode("utf-8", errors="replace")
+
+
+def _upsert_statement(dialect: str):
+    # compiled once and run as executemany; SQLAlchemy batches it into
+    # multi-row INSERT ... ON CONFLICT ... RETURNING ("insertmanyvalues")
+    table = Culture.__table__
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        return None
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.slug],
+        set_={c: getattr(stmt.excluded, c) for c in COLUMNS if c != "slug"},
+    )
+    return stmt.returning(table.c.id, table.c.slug)
+
+
+async def upsert_batch(db: AsyncSession, batch: list[CultureCreate]) -> dict[str, int]:
+    """Upsert one batch by slug (last line wins) and sync galleries in bulk. Returns slug -> id."""
+    by_slug = {item.slug: item for item in batch}
+    rows = [item.dict(include=set(COLUMNS)) for item in by_slug.values()]
+
+    stmt = _upsert_statement(db.get_bind().dialect.name)
+    if stmt is not None:
+        ids = {slug: id_ for id_, slug in (await db.execute(stmt, rows)).all()}
+    else:
+        ids = {}
+        for row in rows:
+            existing = (
+                await db.execute(select(Culture).where(Culture.slug == row["slug"]))
+            ).scalars().first()
+            culture = existing or Culture()
+            for k, v in row.items():
+                setattr(culture, k, v)
+            db.add(culture)
+            await db.flush()
+            ids[culture.slug] = culture.id
+
+    # galleries are diffed like a single culture's edit, so image ids survive re-imports
+    images = CultureImage.__table__
+    current = defaultdict(list)
+    for row in await db.execute(
+        select(images.c.culture_id, images.c.id, images.c.url, images.c.caption, images.c.position)
+        .where(images.c.culture_id.in_(ids.values()))
+        .order_by(images.c.culture_id, images.c.position, images.c.id)
+    ):
+        current[row.culture_id].append(row)
+    to_delete, to_update, to_insert = [], [], []
+    for slug, item in by_slug.items():
+        deleted, updated, inserted = diff_gallery(
+            ids[slug], current[ids[slug]], [img.dict() for img in item.gallery]
+        )
+        to_delete += deleted
+        to_update += updated
+        to_insert += inserted
+
+    if to_delete:
+        await db.execute(delete(images).where(images.c.id.in_(to_delete)))
+    if to_update:
+        await db.execute(update_image, to_update)
+    if to_insert:
+        await db.execute(insert(images), to_insert)
+    await db.commit()
+    return ids
+
+
+async def import_ndjson(db: AsyncSession, chunks, on_batch=None) -> dict:
+    """
+    Validate lines incrementally and upsert them in batches of BATCH_SIZE.
+    A batch the database rejects is rolled back and reported line by line.
+    `on_batch(items, ids)` runs in a worker thread after every committed batch.
+    """
+    processed = upserted = failed = 0
+    errors: list[dict] = []
+    batch: list[tuple[int, CultureCreate]] = []
+
+    def report(line_no, detail):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "error": detail})
+
+    async def flush():
+        nonlocal upserted
+        items = [item for _, item in batch]
+        try:
+            ids = await upsert_batch(db, items)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            for line_no, _ in batch:
+                report(line_no, f"batch rejected by database: {e.__class__.__name__}")
+        else:
+            upserted += len(batch)
+            if on_batch is not None:
+                await asyncio.to_thread(on_batch, items, ids)
+        batch.clear()
+
+    async for line_no, text in ndjson_lines(chunks):
+        processed += 1
+        try:
+            batch.append((line_no, CultureCreate.parse_obj(json.loads(text))))
+        except ValidationError as e:
+            report(line_no, e.errors())
+            continue
+        except ValueError as e:
+            report(line_no, str(e))
+            continue
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    return {"processed": processed, "upserted": upserted, "failed": failed, "errors": errors}
+
+
+def export_ndjson(batch_size: int = 1000):
+    """
+    Yield the catalog as NDJSON through a server-side cursor, one batch of
+    cultures (plus one IN query for their galleries) in memory at a time.
+    Runs in the threadpool with its own session, since the request's
+    dependencies are already closed while a response streams.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            select(Culture.id, *(getattr(Culture, c) for c in COLUMNS)).order_by(Culture.id),
+            execution_options={"stream_results": True, "yield_per": batch_size},
+        )
+        for rows in result.partitions(batch_size):
+            ids = [r.id for r in rows]
+            galleries: dict[int, list[dict]] = {i: [] for i in ids}
+            images = db.execute(
+                select(CultureImage.culture_id, CultureImage.url, CultureImage.caption)
+                .where(CultureImage.culture_id.in_(ids))
+                .order_by(CultureImage.position, CultureImage.id)
+            )
+            for culture_id, url, caption in images:
+                galleries[culture_id].append({"url": url, "caption": caption})
+            lines = []
+            for r in rows:
+                doc = {c: getattr(r, c) for c in COLUMNS}
+                doc["gallery"] = galleries[r.id]
+                lines.append(json.dumps(doc, ensure_ascii=False) + "\n")
+            # one chunk per batch: every chunk is a threadpool hop
+            yield "".join(lines)
+    finally:
+        db.close()
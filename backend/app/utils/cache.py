@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from ..config import settings
+from .compression import choose_encoding, precompress
+from .serialization import dumps
+
+
+class MemoryCache:
+    """Bounded LRU with per-entry TTL, local to one worker process."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    # counters live outside the LRU so they are never evicted
+    def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCache:
+    """Shared backend so every uvicorn worker sees the same entries/invalidations."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed for CACHE_URL=redis://
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self._client.set(key, value, ex=ttl)
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*keys)
+
+    def counter(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+
+def make_backend(url: str | None = None):
+    url = url or settings.cache_url
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    return MemoryCache(settings.cache_max_entries)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag in candidates
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized JSON bodies.
+
+    Entries are stored as `etag\\nsizes\\nbodies`: the identity body plus
+    its gzip/brotli encodings, compressed once when the entry is built, so
+    a hit needs neither re-hashing nor re-compressing.
+    Every key belongs to a group (e.g. all listing pages, or one culture)
+    whose generation counter is part of the key; invalidating bumps the
+    counter. The generation is read before the DB is, so a read racing a
+    write can only ever store under the old, already-dead generation.
+    """
+
+    # the prefix is bumped whenever the entry layout changes
+    def __init__(self, backend=None, ttl: int | None = None, prefix: str = "rc2:"):
+        self.backend = backend or make_backend()
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self.max_age = settings.cache_max_age
+        self.prefix = prefix
+
+    def key(self, group: str, *parts) -> str:
+        gen = self.backend.counter(f"{self.prefix}gen:{group}")
+        return f"{group}:{gen}:" + json.dumps(parts, separators=(",", ":"))
+
+    def invalidate(self, *groups: str):
+        for group in groups:
+            self.backend.incr(f"{self.prefix}gen:{group}")
+
+    @staticmethod
+    def _pack(etag: str, variants: dict[str, bytes]) -> bytes:
+        sizes = " ".join(f"{name}={len(body)}" for name, body in variants.items())
+        return f"{etag}\n{sizes}\n".encode() + b"".join(variants.values())
+
+    @staticmethod
+    def _unpack(raw: bytes) -> tuple[str, dict[str, bytes]]:
+        raw_etag, sizes, data = raw.split(b"\n", 2)
+        variants, offset = {}, 0
+        for item in sizes.decode().split():
+            name, size = item.split("=")
+            variants[name] = data[offset:offset + int(size)]
+            offset += int(size)
+        return raw_etag.decode(), variants
+
+    def respond(self, request: Request, key: str, build) -> Response:
+        """Serve `key` from cache or store `build()` (any jsonable value)."""
+        cached = self.backend.get(self.prefix + key)
+        if cached is None:
+            body = dumps(build())
+            etag = make_etag(body)
+            variants = {"identity": body, **precompress(body)}
+            self.backend.set(self.prefix + key, self._pack(etag, variants), self.ttl)
+        else:
+            etag, variants = self._unpack(cached)
+
+        headers = {"Cache-Control": f"public, max-age={self.max_age}, must-revalidate"}
+        encoding = choose_encoding(request.headers.get("accept-encoding"), [e for e in variants if e != "identity"])
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            # each encoding is its own representation, so it gets its own validator
+            etag = etag[:-1] + f'-{encoding}"'
+            headers["Content-Encoding"] = encoding
+        else:
+            encoding = "identity"
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(variants[encoding], media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ..config import settings
+from .singleflight import normalize_prompt
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of chat answers keyed by (culture slug, normalized question).
+
+    With a similarity threshold below 1.0, a miss falls back to the closest
+    cached question for the same culture by word-set Jaccard similarity.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 86400, similarity: float = 0.85):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._data: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self._by_slug: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_entries=settings.chat_cache_max_entries,
+            ttl=settings.chat_cache_ttl,
+            similarity=settings.chat_cache_similarity,
+        )
+
+    def _evict(self, key):
+        self._data.pop(key, None)
+        questions = self._by_slug.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self._by_slug[key[0]]
+
+    def _lookup(self, key) -> str | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, answer = item
+        if expires < time.monotonic():
+            self._evict(key)
+            return None
+        self._data.move_to_end(key)
+        return answer
+
+    def get(self, slug: str | None, question: str) -> str | None:
+        slug, norm = slug or "", normalize_prompt(question)
+        with self._lock:
+            answer = self._lookup((slug, norm))
+            if answer is not None or self.similarity >= 1.0:
+                return answer
+
+            words = set(norm.split())
+            if not words:
+                return None
+            best, best_score = None, self.similarity
+            for other in self._by_slug.get(slug, ()):
+                other_words = set(other.split())
+                score = len(words & other_words) / len(words | other_words)
+                if score >= best_score:
+                    best, best_score = other, score
+            return self._lookup((slug, best)) if best is not None else None
+
+    def set(self, slug: str | None, question: str, answer: str):
+        key = (slug or "", normalize_prompt(question))
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, answer)
+            self._data.move_to_end(key)
+            self._by_slug.setdefault(key[0], set()).add(key[1])
+            while len(self._data) > self.max_entries:
+                self._evict(next(iter(self._data)))
+
+    def invalidate(self, slug: str):
+        with self._lock:
+            for question in list(self._by_slug.get(slug, ())):
+                self._evict((slug, question))
+
+
+def bypass_requested(headers) -> bool:
+    return (
+        headers.get("x-chat-cache", "").lower() == "bypass"
+        or "no-cache" in headers.get("cache-control", "").lower()
+    )
+
+
+answer_cache = AnswerCache.from_settings()
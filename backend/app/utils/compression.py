@@ -0,0 +1,128 @@
+"""
+Content-Encoding negotiation. Bodies stored by ResponseCache are
+compressed once, at their highest levels, when the entry is built;
+everything else small enough to arrive in one message is compressed per
+response by CompressionMiddleware at a cheaper level. Brotli is used when
+the optional `brotli` package is installed, gzip otherwise.
+"""
+import gzip
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "application/javascript", "text/", "image/svg+xml")
+# once per cache entry, so spend the CPU on the smallest body
+STATIC_LEVELS = {"br": 11, "gzip": 9}
+# bigger bodies are compressed off the event loop
+THREADPOOL_SIZE = 64 * 1024
+
+
+def choose_encoding(accept_encoding: str | None, available=ENCODINGS) -> str | None:
+    """Our preferred encoding among those the client accepts (q > 0)."""
+    if not accept_encoding:
+        return None
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, level: int | None = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.compress_brotli_quality if level is None else level)
+    return gzip.compress(body, compresslevel=settings.compress_gzip_level if level is None else level, mtime=0)
+
+
+def precompress(body: bytes) -> dict[str, bytes]:
+    """Every encoding worth serving for `body`, at the strongest levels."""
+    if len(body) < settings.compress_min_size:
+        return {}
+    variants = {}
+    for encoding in ENCODINGS:
+        packed = compress(body, encoding, STATIC_LEVELS[encoding])
+        if len(packed) < len(body):
+            variants[encoding] = packed
+    return variants
+
+
+def _compressible(headers: Headers) -> bool:
+    return (
+        "content-encoding" not in headers
+        and headers.get("content-type", "").startswith(COMPRESSIBLE)
+        and int(headers.get("content-length", settings.compress_min_size)) >= settings.compress_min_size
+    )
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI. Only whole bodies (a single body message) are compressed:
+    streams such as SSE, NDJSON export or ranged files pass through as-is
+    so nothing gets buffered or delayed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            pending, start = start, None
+            headers = MutableHeaders(raw=pending["headers"])
+            body = message.get("body", b"")
+            if (
+                message["type"] == "http.response.body"
+                and not message.get("more_body", False)
+                and _compressible(headers)
+                and len(body) >= settings.compress_min_size
+            ):
+                if len(body) >= THREADPOOL_SIZE:
+                    packed = await run_in_threadpool(compress, body, encoding)
+                else:
+                    packed = compress(body, encoding)
+                if len(packed) < len(body):
+                    headers["content-encoding"] = encoding
+                    headers["content-length"] = str(len(packed))
+                    headers.add_vary_header("Accept-Encoding")
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["etag"] = "W/" + etag
+                    message = {**message, "body": packed}
+            await send(pending)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
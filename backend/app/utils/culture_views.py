@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Query, Session, raiseload, selectinload
+
+from ..models.culture import Culture
+from ..models.culture_image import CultureImage
+from ..schemas.culture import CultureCard, CultureOut
+from .images import image_variants
+
+# always selected so rows can be keyed/paged and identified by clients
+KEY_FIELDS = ["id", "slug", "name"]
+# cover_srcset is derived from the cover, not a column
+CARD_FIELDS = [f for f in CultureCard.__fields__ if f != "cover_srcset"]
+FULL_FIELDS = list(CultureOut.__fields__)
+
+
+def _cover(column, label):
+    return (
+        select(column)
+        .where(CultureImage.culture_id == Culture.id)
+        .order_by(CultureImage.position, CultureImage.id)
+        .limit(1)
+        .scalar_subquery()
+        .label(label)
+    )
+
+
+cover_url = _cover(CultureImage.url, "cover")
+cover_id = _cover(CultureImage.id, "cover_id")
+
+
+def culture_query(db: Session) -> Query:
+    """Full Culture rows with galleries batch-loaded in one IN query per page.
+
+    Any other lazy load on this path raises instead of silently issuing
+    one query per row.
+    """
+    return db.query(Culture).options(selectinload(Culture.gallery), raiseload("*"))
+
+
+def parse_fields(view: str, fields: str | None) -> list[str] | None:
+    """None means the full CultureOut shape."""
+    if fields:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(wanted) - set(FULL_FIELDS) - {"cover"})
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+        return KEY_FIELDS + [f for f in wanted if f not in KEY_FIELDS]
+    if view == "card":
+        return CARD_FIELDS
+    return None
+
+
+def listing_query(db: Session, columns: list[str] | None) -> Query:
+    if columns is None:
+        return culture_query(db)
+    selected = [getattr(Culture, c) for c in columns if c not in ("gallery", "cover")]
+    if "cover" in columns:
+        selected += [cover_url, cover_id]
+    return db.query(*selected)
+
+
+def shape_rows(db: Session, rows, columns: list[str] | None) -> list:
+    """Turn listing rows into response items (ORM objects or plain dicts)."""
+    if columns is None:
+        return list(rows)
+    items = []
+    for row in rows:
+        item = {c: getattr(row, c) for c in columns if c != "gallery"}
+        if "cover" in columns:
+            item["cover_srcset"] = image_variants(row.cover_id, row.cover)["srcset"] if row.cover else None
+        items.append(item)
+    if "gallery" in columns and items:
+        galleries = defaultdict(list)
+        images = (
+            db.query(
+                CultureImage.culture_id, CultureImage.id, CultureImage.url,
+                CultureImage.caption, CultureImage.position,
+            )
+            .filter(CultureImage.culture_id.in_([i["id"] for i in items]))
+            .order_by(CultureImage.position, CultureImage.id)
+        )
+        for culture_id, image_id, url, caption, position in images:
+            galleries[culture_id].append(
+                {"id": image_id, "url": url, "caption": caption, "position": position,
+                 **image_variants(image_id, url)}
+            )
+        for item in items:
+            item["gallery"] = galleries[item["id"]]
+    return items
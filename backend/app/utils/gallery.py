@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models.culture_image import CultureImage
+
+images = CultureImage.__table__
+
+update_image = (
+    update(images)
+    .where(images.c.id == bindparam("_id"))
+    .values(
+        url=bindparam("url"),
+        caption=bindparam("caption"),
+        position=bindparam("position"),
+    )
+)
+
+
+def diff_gallery(culture_id: int, current, wanted: list[dict]):
+    """
+    What it takes to turn `current` (stored rows with id/url/caption/position,
+    in gallery order) into `wanted` (ordered dicts with url/caption): rows
+    are matched by URL (in order, so repeated URLs pair up) and unchanged
+    rows are left out. Returns (ids to delete, updates, inserts).
+    """
+    by_url = defaultdict(list)
+    for row in current:
+        by_url[row.url].append(row)
+
+    to_insert, to_update = [], []
+    for position, img in enumerate(wanted):
+        matches = by_url.get(img["url"])
+        if matches:
+            row = matches.pop(0)
+            if row.caption != img.get("caption") or row.position != position:
+                to_update.append({
+                    "_id": row.id, "url": row.url,
+                    "caption": img.get("caption"), "position": position,
+                })
+        else:
+            to_insert.append({
+                "culture_id": culture_id, "url": img["url"],
+                "caption": img.get("caption"), "position": position,
+            })
+    to_delete = [row.id for rows in by_url.values() for row in rows]
+    return to_delete, to_update, to_insert
+
+
+def apply_gallery(db: Session, culture_id: int, wanted: list[dict]) -> dict:
+    """
+    Bring a culture's gallery to `wanted` by diffing against what is
+    stored (see diff_gallery): the changes are one DELETE, one executemany
+    UPDATE and one executemany INSERT. Image ids survive caption edits
+    and reordering.
+    """
+    current = db.execute(
+        select(images.c.id, images.c.url, images.c.caption, images.c.position)
+        .where(images.c.culture_id == culture_id)
+        .order_by(images.c.position, images.c.id)
+    ).all()
+    to_delete, to_update, to_insert = diff_gallery(culture_id, current, wanted)
+
+    if to_delete:
+        db.execute(delete(images).where(images.c.id.in_(to_delete)))
+    if to_update:
+        db.execute(update_image, to_update)
+    if to_insert:
+        db.execute(insert(images), to_insert)
+    return {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete)}
+
+
+def move_image(db: Session, culture_id: int, image_id: int, position: int):
+    """Move one image to `position` and renumber only the rows whose position changed."""
+    rows = db.execute(
+        select(images.c.id, images.c.url, images.c.caption, images.c.position)
+        .where(images.c.culture_id == culture_id)
+        .order_by(images.c.position, images.c.id)
+    ).all()
+    ordered = [r for r in rows if r.id != image_id]
+    moving = next(r for r in rows if r.id == image_id)
+    ordered.insert(min(position, len(ordered)), moving)
+    changes = [
+        {"_id": r.id, "url": r.url, "caption": r.caption, "position": i}
+        for i, r in enumerate(ordered)
+        if r.position != i
+    ]
+    if changes:
+        db.execute(update_image, changes)
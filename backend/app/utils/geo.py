@@ -0,0 +1,181 @@
+import math
+import threading
+
+from ..config import settings
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 1.0  # base grid resolution
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_bbox(value: str) -> tuple[float, float, float, float]:
+    """'min_lon,min_lat,max_lon,max_lat'; min_lon > max_lon crosses the antimeridian."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180
+            and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox out of range")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _lon_ranges(min_lon, max_lon):
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+class GeoIndex:
+    """
+    Uniform 1° grid over culture coordinates, kept in memory like the
+    suggest index. Bbox queries only touch overlapping cells (or the
+    occupied ones, whichever is fewer); clustering and nearest-N are done
+    on top of that.
+    """
+
+    def __init__(self, cluster_max_zoom: int | None = None):
+        self.cluster_max_zoom = (
+            cluster_max_zoom if cluster_max_zoom is not None
+            else settings.geo_cluster_max_zoom
+        )
+        self._lock = threading.Lock()
+        self._cells: dict[tuple[int, int], dict[str, dict]] = {}
+        self._where: dict[str, tuple[int, int]] = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    @staticmethod
+    def _cell(lat, lon) -> tuple[int, int]:
+        return (
+            min(int(math.floor((lon + 180) / CELL_DEG)), int(360 / CELL_DEG) - 1),
+            min(int(math.floor((lat + 90) / CELL_DEG)), int(180 / CELL_DEG) - 1),
+        )
+
+    def _drop(self, slug):
+        cell = self._where.pop(slug, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            bucket.pop(slug, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _add(self, slug, name, lat, lon):
+        if lat is None or lon is None:
+            return
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[slug] = {"slug": slug, "name": name, "lat": lat, "lon": lon}
+        self._where[slug] = cell
+
+    def rebuild(self, rows):
+        """rows: iterable of (slug, name, latitude, longitude)."""
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+            for slug, name, lat, lon in rows:
+                self._add(slug, name, lat, lon)
+
+    def upsert(self, culture, old_slug: str | None = None):
+        with self._lock:
+            self._drop(old_slug or culture.slug)
+            self._drop(culture.slug)
+            self._add(culture.slug, culture.name, culture.latitude, culture.longitude)
+
+    def remove(self, slug: str):
+        with self._lock:
+            self._drop(slug)
+
+    def _in_bbox(self, min_lon, min_lat, max_lon, max_lat) -> list[dict]:
+        out = []
+        for lo, hi in _lon_ranges(min_lon, max_lon):
+            x0, y0 = self._cell(min_lat, lo)
+            x1, y1 = self._cell(max_lat, hi)
+            span = (x1 - x0 + 1) * (y1 - y0 + 1)
+            if span > len(self._cells):
+                cells = [b for (x, y), b in self._cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+            else:
+                cells = [
+                    self._cells[(x, y)]
+                    for x in range(x0, x1 + 1)
+                    for y in range(y0, y1 + 1)
+                    if (x, y) in self._cells
+                ]
+            for bucket in cells:
+                out.extend(
+                    p for p in bucket.values()
+                    if lo <= p["lon"] <= hi and min_lat <= p["lat"] <= max_lat
+                )
+        return out
+
+    def viewport(self, bbox, zoom: int) -> dict:
+        with self._lock:
+            points = self._in_bbox(*bbox)
+        if zoom >= self.cluster_max_zoom:
+            return {"points": points, "clusters": []}
+
+        # grid clustering: cells halve in size with every zoom level
+        size = 45.0 / (2 ** max(zoom, 0))
+        groups: dict[tuple[int, int], list[dict]] = {}
+        for p in points:
+            key = (int(math.floor(p["lon"] / size)), int(math.floor(p["lat"] / size)))
+            groups.setdefault(key, []).append(p)
+
+        singles, clusters = [], []
+        for members in groups.values():
+            if len(members) == 1:
+                singles.append(members[0])
+                continue
+            clusters.append({
+                "lat": sum(m["lat"] for m in members) / len(members),
+                "lon": sum(m["lon"] for m in members) / len(members),
+                "count": len(members),
+            })
+        return {"points": singles, "clusters": clusters}
+
+    def nearest(self, lat: float, lon: float, n: int) -> list[dict]:
+        with self._lock:
+            if not self._where:
+                return []
+            # grow a square window until it holds n candidates ...
+            found: list[dict] = []
+            radius = CELL_DEG
+            while radius < 360:
+                found = self._in_bbox(*self._window(lat, lon, radius, radius))
+                if len(found) >= n or len(found) == len(self._where):
+                    break
+                radius *= 2
+            if not found:
+                found = self._in_bbox(-180, -90, 180, 90)
+
+            # ... then widen it to the true n-th distance so the answer is exact
+            best = sorted(found, key=lambda p: haversine_km(lat, lon, p["lat"], p["lon"]))
+            limit_km = haversine_km(lat, lon, best[min(n, len(best)) - 1]["lat"], best[min(n, len(best)) - 1]["lon"])
+            dlat = math.degrees(limit_km / EARTH_RADIUS_KM)
+            coslat = math.cos(math.radians(min(90.0, abs(lat) + dlat)))
+            dlon = 360.0 if coslat < 1e-6 else math.degrees(limit_km / (EARTH_RADIUS_KM * coslat))
+            candidates = self._in_bbox(*self._window(lat, lon, dlat, dlon))
+
+        ranked = sorted(
+            ({**p, "distance_km": round(haversine_km(lat, lon, p["lat"], p["lon"]), 3)} for p in candidates),
+            key=lambda p: p["distance_km"],
+        )
+        return ranked[:n]
+
+    @staticmethod
+    def _window(lat, lon, dlat, dlon):
+        min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+        if dlon >= 180:
+            return -180.0, min_lat, 180.0, max_lat
+        min_lon = (lon - dlon + 180) % 360 - 180
+        max_lon = (lon + dlon + 180) % 360 - 180
+        return min_lon, min_lat, max_lon, max_lat
+
+
+geo_index = GeoIndex()
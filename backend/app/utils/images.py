@@ -0,0 +1,340 @@
+"""
+Resized/re-encoded derivatives of gallery images and media thumbnails.
+
+Originals are fetched once (paths under IMAGE_SOURCE_DIR for the
+frontend's /assets, or http(s) urls on IMAGE_ALLOWED_HOSTS that resolve
+to public addresses, fetched from the checked address without following
+redirects), and both originals and derivatives live in a
+content-addressed disk cache: a derivative's name is the hash of the
+original's bytes plus width/format/quality, so it never changes meaning
+and can be served as immutable. Decoding and encoding are CPU-bound and
+run in a process pool, never on the event loop.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+from urllib.parse import urlencode, urlsplit
+
+from ..config import settings
+from .metrics import image_render, image_requests
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    import httpx
+
+log = logging.getLogger(__name__)
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+WIDTHS = sorted(settings.image_widths)
+DEFAULT_WIDTH = settings.image_default_width
+ALLOWED_HOSTS = [h.lower().rstrip(".") for h in settings.image_allowed_hosts]
+# EXIF orientations that swap width and height
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+class ImageError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Derivative(NamedTuple):
+    path: Path
+    etag: str
+    media_type: str
+
+
+def snap_width(width: int | None) -> int:
+    """Round up to the next allowed width, so arbitrary ?w= values can't fill the cache."""
+    if width is None:
+        return DEFAULT_WIDTH
+    for allowed in WIDTHS:
+        if allowed >= width:
+            return allowed
+    return WIDTHS[-1]
+
+
+def source_version(url: str) -> str:
+    """Short tag of the original's url; variant urls change when the image is replaced."""
+    return hashlib.sha256(url.encode()).hexdigest()[:10]
+
+
+def variant_url(path: str, url: str, width: int, fmt: str) -> str:
+    return f"{path}?" + urlencode({"w": width, "fmt": fmt, "v": source_version(url)})
+
+
+def is_remote(url: str) -> bool:
+    return url.startswith(("http://", "https://"))
+
+
+def host_allowed(url: str) -> bool:
+    host = (urlsplit(url).hostname or "").rstrip(".")
+    return bool(host) and any(
+        host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+        for allowed in ALLOWED_HOSTS
+    )
+
+
+def image_variants(image_id: int, url: str, prefix: str = "/api/images") -> dict:
+    """`src` (universally decodable) and a WebP `srcset` for <img>; none for originals we won't fetch."""
+    if is_remote(url) and not host_allowed(url):
+        return {"src": None, "srcset": None}
+    path = f"{prefix}/{image_id}"
+    return {
+        "src": variant_url(path, url, DEFAULT_WIDTH, "jpeg"),
+        "srcset": ", ".join(f"{variant_url(path, url, w, 'webp')} {w}w" for w in WIDTHS),
+    }
+
+
+def _render(src: str, dst: str, width: int, fmt: str, quality: int) -> None:
+    """Runs in a worker process."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = 64_000_000
+    try:
+        with Image.open(src) as im:
+            swapped = im.getexif().get(0x0112) in _TRANSPOSED
+            w, h = (im.height, im.width) if swapped else (im.width, im.height)
+            if w > width:
+                target = (width, max(1, round(h * width / w)))
+                # JPEG can decode straight at 1/2, 1/4 or 1/8 scale
+                im.draft(im.mode, target[::-1] if swapped else target)
+            im = ImageOps.exif_transpose(im)
+            if im.width > width:
+                im = im.resize((width, max(1, round(im.height * width / im.width))), Image.Resampling.LANCZOS)
+            has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+            if fmt == "jpeg" and has_alpha:
+                rgba = im.convert("RGBA")
+                im = Image.new("RGB", rgba.size, (255, 255, 255))
+                im.paste(rgba, mask=rgba.getchannel("A"))
+            elif im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if has_alpha and fmt == "webp" else "RGB")
+            tmp = f"{dst}.{os.getpid()}.tmp"
+            if fmt == "webp":
+                im.save(tmp, "WEBP", quality=quality, method=4)
+            else:
+                im.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, dst)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        # PIL's exceptions don't all survive pickling back to the parent
+        raise ValueError(f"cannot decode image: {e}") from None
+
+
+class DiskCache:
+    """
+    Files named by content hash under `root/ab/abcdef…`. Hits touch the
+    mtime, and once the total passes `max_bytes` the least recently used
+    files are removed down to 90% of it.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.{ext}"
+
+    def get(self, digest: str, ext: str) -> Path | None:
+        path = self.path(digest, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def reserve(self, digest: str, ext: str) -> Path:
+        path = self.path(digest, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _files(self):
+        for entry in os.scandir(self.root) if self.root.is_dir() else ():
+            if entry.is_dir() and len(entry.name) == 2:
+                for f in os.scandir(entry.path):
+                    if not f.name.endswith(".tmp"):
+                        yield f
+
+    def added(self, path: Path):
+        """Account for a newly written file; evicts if over budget."""
+        size = path.stat().st_size
+        with self._lock:
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self._files())
+            else:
+                self._size += size
+            if self._size <= self.max_bytes:
+                return
+            files = sorted(self._files(), key=lambda f: f.stat().st_mtime)
+            target = self.max_bytes * 0.9
+            for f in files:
+                if self._size <= target:
+                    break
+                if f.path == str(path):
+                    continue
+                try:
+                    freed = f.stat().st_size
+                    os.unlink(f.path)
+                except FileNotFoundError:
+                    continue
+                self._size -= freed
+            log.info("image cache evicted down to %d bytes", self._size)
+
+
+class ImageService:
+    def __init__(self, cache: DiskCache | None = None):
+        self.cache = cache or DiskCache(settings.image_cache_dir, settings.image_cache_max_bytes)
+        self.source_dir = Path(settings.image_source_dir).resolve()
+        self.quality = settings.image_quality
+        self._pool: ProcessPoolExecutor | None = None
+        self._client: "httpx.AsyncClient | None" = None
+        # url -> digest of the original's bytes; bounded, refetched on miss
+        self._sources: OrderedDict[str, str] = OrderedDict()
+        self._flight = SingleFlight()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and DB pools is unsafe
+            self._pool = ProcessPoolExecutor(settings.image_workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    @staticmethod
+    async def _check_remote(url: str) -> str:
+        """
+        Allowlisted host, resolving only to public addresses (no loopback,
+        private, link-local...). Returns the address to connect to.
+        """
+        if not host_allowed(url):
+            raise ImageError(403, "Image host is not allowed")
+        parts = urlsplit(url)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            raise ImageError(502, f"Cannot resolve image host: {e}") from e
+        for *_, sockaddr in infos:
+            ip = ipaddress.ip_address(sockaddr[0].split("%")[0])
+            if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global:
+                raise ImageError(403, "Image host resolves to a non-public address")
+        return str(ipaddress.ip_address(infos[0][4][0].split("%")[0]))
+
+    @staticmethod
+    def _pinned(url: str, ip: str) -> tuple[str, dict, dict]:
+        """
+        The request for `url` sent to `ip` itself, so a second DNS lookup
+        can't swap in another address; Host and the TLS server name (SNI
+        and certificate check) still carry the original hostname.
+        """
+        parts = urlsplit(url)
+        port = f":{parts.port}" if parts.port else ""
+        address = f"[{ip}]" if ":" in ip else ip
+        pinned = parts._replace(netloc=address + port).geturl()
+        return pinned, {"Host": parts.hostname + port}, {"sni_hostname": parts.hostname}
+
+    async def _read_source(self, url: str) -> bytes:
+        if is_remote(url):
+            import httpx
+
+            pinned, headers, extensions = self._pinned(url, await self._check_remote(url))
+            if self._client is None:
+                # a redirect could point anywhere, including back inside the network,
+                # and a proxy from the environment would resolve the host again
+                self._client = httpx.AsyncClient(
+                    timeout=settings.image_fetch_timeout, follow_redirects=False, trust_env=False
+                )
+            try:
+                async with self._client.stream("GET", pinned, headers=headers, extensions=extensions) as resp:
+                    if resp.status_code != 200:
+                        raise ImageError(502, f"Original image returned {resp.status_code}")
+                    chunks, size = [], 0
+                    async for chunk in resp.aiter_bytes():
+                        size += len(chunk)
+                        if size > settings.image_max_source_bytes:
+                            raise ImageError(502, "Original image is too large")
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+            except httpx.HTTPError as e:
+                raise ImageError(502, f"Cannot fetch original image: {e}") from e
+
+        path = (self.source_dir / url.lstrip("/")).resolve()
+        if not path.is_relative_to(self.source_dir) or not path.is_file():
+            raise ImageError(404, "Original image not found")
+        if path.stat().st_size > settings.image_max_source_bytes:
+            raise ImageError(502, "Original image is too large")
+        return await asyncio.to_thread(path.read_bytes)
+
+    async def _source(self, url: str) -> tuple[str, Path]:
+        digest = self._sources.get(url)
+        path = self.cache.get(digest, "src") if digest else None
+        if path is None:
+            data = await self._read_source(url)
+            digest = hashlib.sha256(data).hexdigest()
+            path = self.cache.get(digest, "src")
+            if path is None:
+                path = self.cache.reserve(digest, "src")
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                await asyncio.to_thread(tmp.write_bytes, data)
+                os.replace(tmp, path)
+                await asyncio.to_thread(self.cache.added, path)
+            self._sources[url] = digest
+            while len(self._sources) > 4096:
+                self._sources.popitem(last=False)
+        self._sources.move_to_end(url)
+        return digest, path
+
+    async def _build(self, url: str, width: int, fmt: str) -> Derivative:
+        src_digest, src_path = await self._source(url)
+        digest = hashlib.sha256(f"{src_digest}:{width}:{fmt}:{self.quality}".encode()).hexdigest()
+        path = self.cache.get(digest, fmt)
+        if path is None:
+            path = self.cache.reserve(digest, fmt)
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(
+                    self.pool, _render, str(src_path), str(path), width, fmt, self.quality
+                )
+            except ValueError as e:
+                raise ImageError(415, str(e)) from e
+            except BrokenProcessPool as e:
+                # a worker died (e.g. OOM on a huge original); start a fresh pool next time
+                self._pool = None
+                raise ImageError(503, "Image worker crashed") from e
+            image_render.observe(time.perf_counter() - started, fmt)
+            image_requests.inc("rendered")
+            await asyncio.to_thread(self.cache.added, path)
+        else:
+            image_requests.inc("hit")
+        return Derivative(path, f'"{digest[:32]}"', FORMATS[fmt])
+
+    async def derivative(self, url: str, width: int, fmt: str) -> Derivative:
+        """The `width`-wide `fmt` rendition of `url`, rendering it once if needed."""
+        return await self._flight.do(("image", url, width, fmt), lambda: self._build(url, width, fmt))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_service = ImageService()
@@ -0,0 +1,87 @@
+"""
+Keeps each worker's in-memory catalog indexes in step with writes made by
+other workers.
+
+The worker that handles a write updates its own indexes directly and then
+bumps a generation counter in the cache backend (shared when CACHE_URL is
+redis://). Every INDEX_SYNC_INTERVAL seconds each worker reads the counter
+and, if it moved past the generation its indexes were last synced at,
+re-syncs them from the database.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable
+
+from ..config import settings
+from .cache import response_cache
+
+log = logging.getLogger(__name__)
+
+GENERATION_KEY = "idx:catalog"
+
+
+class IndexSync:
+    def __init__(self, backend, key: str = GENERATION_KEY):
+        self.backend = backend
+        self.key = key
+        self._syncs: dict[str, Callable[[], None]] = {}
+        self._seen = 0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def register(self, name: str, sync: Callable[[], None]):
+        """sync() reloads one index from the database."""
+        self._syncs[name] = sync
+
+    def bump(self):
+        """Call after a catalog write this worker already applied to its own indexes."""
+        generation = self.backend.incr(self.key)
+        with self._lock:
+            # nobody else wrote since our last sync: we are still current
+            if generation == self._seen + 1:
+                self._seen = generation
+
+    def refresh(self) -> bool:
+        """Re-sync every index if another worker wrote since the last sync."""
+        generation = self.backend.counter(self.key)
+        with self._lock:
+            if generation == self._seen:
+                return False
+        started = time.perf_counter()
+        ok = True
+        for name, sync in self._syncs.items():
+            try:
+                sync()
+            except Exception:
+                ok = False
+                log.exception("%s index sync failed", name)
+        if ok:
+            # read before syncing: a write that lands meanwhile bumps past it
+            with self._lock:
+                self._seen = max(self._seen, generation)
+        log.info("indexes synced to generation %d in %.0f ms", generation, (time.perf_counter() - started) * 1000)
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.index_sync_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                log.exception("index sync check failed")
+
+    def start(self):
+        """Call before the first build, so writes made during it are caught up on."""
+        if self._task is None:
+            self._seen = self.backend.counter(self.key)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+index_sync = IndexSync(response_cache.backend)
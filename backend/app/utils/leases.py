@@ -0,0 +1,52 @@
+"""
+Cross-process claims on background work. Every uvicorn worker (and every
+replica of the service) runs the same background loops; before doing a
+unit of work, a worker claims it here so only one of them does.
+
+A claim is a row in `leases`. Taking it is a single conditional UPDATE
+(free when expired or already ours), or an INSERT when the row doesn't
+exist yet, whose primary key makes concurrent inserts lose cleanly.
+Leases expire, so a crashed worker's claims are picked up again.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.lease import Lease
+
+# unique per process, readable in the table
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def lease_expiry(ttl: float) -> datetime:
+    return datetime.utcnow() + timedelta(seconds=ttl)
+
+
+async def claim(db: AsyncSession, name: str, ttl: float) -> bool:
+    """Take or renew the lease; False while another worker holds it."""
+    now = datetime.utcnow()
+    taken = await db.execute(
+        update(Lease)
+        .where(Lease.name == name, or_(Lease.owner == WORKER_ID, Lease.expires_at < now))
+        .values(owner=WORKER_ID, expires_at=lease_expiry(ttl))
+    )
+    if taken.rowcount:
+        await db.commit()
+        return True
+    try:
+        await db.execute(insert(Lease).values(name=name, owner=WORKER_ID, expires_at=lease_expiry(ttl)))
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return True
+
+
+async def release(db: AsyncSession, name: str):
+    await db.execute(delete(Lease).where(Lease.name == name, Lease.owner == WORKER_ID))
+    await db.commit()
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, NamedTuple
+
+from ..config import settings
+from .metrics import record_llm
+
+if TYPE_CHECKING:
+    import httpx
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class Completion(NamedTuple):
+    content: str
+    usage: dict
+    model: str
+
+
+class RetryBudget:
+    """
+    Retries may use at most `ratio` extra calls per first attempt (plus a
+    small floor per second), so an upstream outage can't turn into a retry
+    storm that multiplies our load on it.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 50.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._stamp) * self.min_per_second)
+        self._stamp = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class LLMClient:
+    """
+    One long-lived, pooled HTTP client for the OpenAI-compatible chat API.
+
+    Point OPENAI_BASE_URL at a local stub to run without OpenAI, or pass a
+    custom httpx `transport` (e.g. httpx.MockTransport) in tests.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        max_retries: int | None = None,
+        transport: "httpx.AsyncBaseTransport | None" = None,
+    ):
+        # httpx (and its CLI deps) cost ~0.1s to import; only pay it on first use
+        import httpx
+
+        self.api_key = api_key or settings.openai_api_key
+        self.base_url = (base_url or settings.openai_base_url).rstrip("/")
+        self.timeout = timeout or settings.llm_timeout
+        self.max_retries = max_retries if max_retries is not None else settings.llm_max_retries
+        concurrency = max_concurrency or settings.llm_max_concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.budget = RetryBudget(ratio=settings.llm_retry_ratio)
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+                keepalive_expiry=60,
+            ),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter, capped
+        return random.uniform(0, min(4.0, 0.25 * 2 ** attempt))
+
+    async def _post(self, path: str, payload: dict, timeout: float | None) -> dict:
+        import httpx
+
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    resp = await self._http.post(path, json=payload, timeout=timeout or self.timeout)
+                if resp.status_code < 400:
+                    return resp.json()
+                error = LLMError(f"upstream returned {resp.status_code}: {resp.text[:200]}")
+                retryable = resp.status_code in RETRY_STATUSES
+            except httpx.TimeoutException as e:
+                error, retryable = LLMError(f"upstream timed out: {e!r}"), True
+            except httpx.TransportError as e:
+                error, retryable = LLMError(f"upstream connection failed: {e!r}"), True
+
+            if not retryable or attempt >= self.max_retries or not self.budget.withdraw():
+                raise error
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def chat(
+        self,
+        messages: list[dict],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        timeout: float | None = None,
+        response_format: dict | None = None,
+    ) -> Completion:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format is not None:
+            payload["response_format"] = response_format
+        started = time.perf_counter()
+        try:
+            data = await self._post("/chat/completions", payload, timeout)
+            content = data["choices"][0]["message"]["content"].strip()
+        except LLMError:
+            record_llm("chat", started, "error")
+            raise
+        except (KeyError, IndexError, TypeError, AttributeError):
+            record_llm("chat", started, "error")
+            raise LLMError("malformed upstream response")
+        usage = data.get("usage") or {}
+        record_llm("chat", started, "ok", usage)
+        return Completion(content, usage, data.get("model", model))
+
+    async def stream(
+        self,
+        messages: list[dict],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        timeout: float | None = None,
+    ):
+        """
+        Yield ("delta", text) for each upstream token chunk, then
+        ("usage", dict) once. Cancelling the consumer or closing the
+        generator early (client went away) closes the upstream connection
+        too. Streams aren't retried.
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        import httpx
+
+        usage: dict = {}
+        started = time.perf_counter()
+        outcome = "error"
+        async with self.semaphore:
+            try:
+                async with self._http.stream(
+                    "POST", "/chat/completions", json=payload, timeout=timeout or self.timeout
+                ) as resp:
+                    if resp.status_code >= 400:
+                        body = (await resp.aread()).decode(errors="replace")
+                        raise LLMError(f"upstream returned {resp.status_code}: {body[:200]}")
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            raise LLMError("malformed upstream stream chunk")
+                        usage = chunk.get("usage") or usage
+                        for choice in chunk.get("choices") or []:
+                            text = (choice.get("delta") or {}).get("content")
+                            if text:
+                                yield "delta", text
+                outcome = "ok"
+            except httpx.TimeoutException as e:
+                raise LLMError(f"upstream timed out: {e!r}")
+            except httpx.TransportError as e:
+                raise LLMError(f"upstream connection failed: {e!r}")
+            except (asyncio.CancelledError, GeneratorExit):
+                # client went away: the response task is cancelled mid-await,
+                # or the generator is closed between chunks
+                outcome = "cancelled"
+                raise
+            finally:
+                record_llm("stream", started, outcome, usage)
+        yield "usage", usage
+
+
+_client: LLMClient | None = None
+
+
+def llm_configured() -> bool:
+    # a custom base URL (local stub, proxy) may not need a key
+    return bool(settings.openai_api_key) or not settings.openai_base_url.startswith("https://api.openai.com")
+
+
+def get_llm() -> LLMClient:
+    """Process-wide client, created on first use (inside the running loop)."""
+    global _client
+    if _client is None:
+        if not llm_configured():
+            raise LLMError("OPENAI_API_KEY is not configured")
+        _client = LLMClient()
+    return _client
+
+
+async def close_llm():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
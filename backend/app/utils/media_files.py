@@ -0,0 +1,263 @@
+"""
+Locally hosted audio/video: content-addressed storage under MEDIA_DIR,
+duration probing on ingest, and a FileResponse that honours Range,
+If-Range and conditional GETs so players can seek without the server
+re-reading (or buffering) the file from the start.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from ..config import settings
+from .cache import etag_matches
+
+log = logging.getLogger(__name__)
+
+MEDIA_DIR = Path(settings.media_dir)
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+async def store_upload(chunks, suffix: str) -> tuple[str, int]:
+    """
+    Stream an upload to MEDIA_DIR without holding it in memory. Files are
+    named by their sha256, so identical uploads share one file. Returns
+    (path relative to MEDIA_DIR, size).
+    """
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = MEDIA_DIR / f".upload-{os.getpid()}-{id(chunks):x}.tmp"
+    digest, size = hashlib.sha256(), 0
+    try:
+        async with await anyio.open_file(tmp, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.media_max_upload_bytes:
+                    raise MediaTooLarge()
+                digest.update(chunk)
+                await f.write(chunk)
+        name = f"{digest.hexdigest()[:2]}/{digest.hexdigest()}{suffix.lower()}"
+        (MEDIA_DIR / name).parent.mkdir(exist_ok=True)
+        os.replace(tmp, MEDIA_DIR / name)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return name, size
+
+
+def remove_file(name: str):
+    (MEDIA_DIR / name).unlink(missing_ok=True)
+
+
+def _mp4_duration(f) -> float | None:
+    """mvhd duration / timescale; the moov box may sit after mdat, so boxes are skipped by seeking."""
+    end = os.fstat(f.fileno()).st_size
+    pos, limit = 0, end
+    while pos + 8 <= limit:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size, header = struct.unpack(">Q", f.read(8))[0], 16
+        elif size == 0:
+            size = limit - pos
+        if size < header:
+            return None
+        if kind == b"moov":
+            pos, limit = pos + header, pos + size
+            continue
+        if kind == b"mvhd":
+            version = f.read(4)[0]
+            if version == 1:
+                _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+            else:
+                _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+            return duration / timescale if timescale else None
+        pos += size
+    return None
+
+
+def _wav_duration(f) -> float | None:
+    f.seek(12)
+    byte_rate = None
+    while chunk := f.read(8):
+        if len(chunk) < 8:
+            return None
+        kind, size = struct.unpack("<4sI", chunk)
+        if kind == b"fmt ":
+            byte_rate = struct.unpack("<HHII", f.read(12))[3]
+            f.seek(size - 12, os.SEEK_CUR)
+        elif kind == b"data":
+            return size / byte_rate if byte_rate else None
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)
+    return None
+
+
+def probe_duration(name: str) -> int | None:
+    """Whole seconds, via ffprobe when installed, else from MP4/M4A or WAV headers."""
+    path = MEDIA_DIR / name
+    if shutil.which("ffprobe"):
+        try:
+            out = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", str(path)],
+                capture_output=True, timeout=30, check=True,
+            ).stdout
+            return round(float(json.loads(out)["format"]["duration"]))
+        except (subprocess.SubprocessError, KeyError, ValueError) as e:
+            log.warning("ffprobe failed for %s: %s", name, e)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+            if head[4:8] == b"ftyp":
+                seconds = _mp4_duration(f)
+            elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                seconds = _wav_duration(f)
+            else:
+                return None
+    except (OSError, struct.error, IndexError):
+        return None
+    return round(seconds) if seconds is not None else None
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    (first, last) byte of a single `bytes=` range; None to ignore the header
+    and send the whole file (malformed or multi-range). Raises ValueError
+    when the range lies past the end of the file, which is any range of an
+    empty file.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise ValueError(header)
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse plus 304s for If-None-Match/If-Modified-Since and 206s for
+    a single Range (guarded by If-Range). Range bodies go out through the
+    ASGI zero-copy extension when the server offers it (sendfile), else in
+    chunks read from the requested offset.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+
+    def _not_modified(self, req) -> bool:
+        if "if-none-match" in req:
+            return etag_matches(req["if-none-match"], self.headers["etag"])
+        if "if-modified-since" in req:
+            try:
+                return int(self.stat_result.st_mtime) <= parsedate_to_datetime(req["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range_applies(self, req) -> bool:
+        if_range = req.get("if-range")
+        if if_range is None:
+            return True
+        # If-Range needs an exact (strong) match on the validator
+        if if_range.startswith(('"', "W/")):
+            return if_range == self.headers["etag"]
+        return if_range == self.headers["last-modified"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        req = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        size = self.stat_result.st_size
+
+        if self._not_modified(req):
+            self.status_code = 304
+            del self.headers["content-length"]
+            await send({"type": "http.response.start", "status": 304, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        span = None
+        if "range" in req and self._range_applies(req):
+            try:
+                span = parse_range(req["range"], size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                await send({"type": "http.response.start", "status": 416, "headers": self.raw_headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        if span is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        first, last = span
+        count = last - first + 1
+        self.status_code = 206
+        self.headers["content-range"] = f"bytes {first}-{last}/{size}"
+        self.headers["content-length"] = str(count)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        extensions = scope.get("extensions") or {}
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": first,
+                    "count": count,
+                })
+                return
+            await file.seek(first)
+            while count > 0:
+                chunk = await file.read(min(self.chunk_size, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                # file shrank under us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b""})
+
+
+def media_response(name: str, media_type: str | None) -> RangeFileResponse:
+    path = MEDIA_DIR / name
+    stat_result = os.stat(path)
+    # the file name is its sha256, a strong validator that survives copies/restores
+    etag = '"' + Path(name).stem + '"'
+    return RangeFileResponse(
+        path,
+        stat_result=stat_result,
+        media_type=media_type,
+        headers={
+            "etag": etag,
+            "cache-control": "public, max-age=86400",
+        },
+    )
@@ -0,0 +1,309 @@
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as Tally, deque
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from ..config import settings
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (made cumulative on render), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, ([*v[0]], v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        names = self.label_names + ("le",)
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip((*self.buckets, "+Inf"), counts):
+                running += c
+                lines.append(f"{self.name}_bucket{_labels(names, (*key, bound))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class Registry:
+    """Just enough of the Prometheus client model for our own metrics."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """fn() -> list of exposition lines, called on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")))
+http_latency = registry.add(Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body.", ("method", "route")))
+http_in_flight = registry.add(Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method", "route")))
+db_queries = registry.add(Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)))
+db_time = registry.add(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time.", ("route",)))
+llm_latency = registry.add(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call latency.", ("op", "outcome")))
+llm_tokens = registry.add(Counter(
+    "llm_tokens_total", "Tokens reported by the LLM API.", ("op", "kind")))
+quiz_generations = registry.add(Counter(
+    "quiz_generate_total", "generate_quiz answers by source (warm, generated, fallback).", ("source",)))
+admission_decisions = registry.add(Counter(
+    "admission_decisions_total", "LLM admission outcomes per pool.", ("pool", "outcome")))
+admission_queue = registry.add(Gauge(
+    "admission_queue_depth", "Requests waiting for a slot in this worker.", ("pool",)))
+admission_wait = registry.add(Histogram(
+    "admission_wait_seconds", "Time queued requests waited before being admitted.", ("pool",)))
+image_requests = registry.add(Counter(
+    "image_derivatives_total", "Image derivative lookups by result (hit, rendered).", ("result",)))
+image_render = registry.add(Histogram(
+    "image_render_seconds", "Time to resize and encode one derivative in the worker pool.", ("format",)))
+
+
+class RequestStats:
+    __slots__ = ("route", "db_count", "db_seconds", "llm_seconds")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.llm_seconds = 0.0
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"app;dur={total * 1000:.1f}"]
+        if self.db_count:
+            parts.append(f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries"')
+        if self.llm_seconds:
+            parts.append(f"llm;dur={self.llm_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+# the stats object is shared by reference, so threadpool copies of the
+# context (sync routes) still add to the same request
+current_request: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+def instrument_engine(engine):
+    """Count statements and their time against the request that issued them."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = current_request.get()
+        route = stats.route if stats is not None else "background"
+        db_time.observe(elapsed, route)
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_seconds += elapsed
+
+
+def record_llm(op: str, started: float, outcome: str, usage: dict | None = None):
+    elapsed = time.perf_counter() - started
+    llm_latency.observe(elapsed, op, outcome)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            llm_tokens.inc(op, kind.split("_")[0], amount=usage[kind])
+    stats = current_request.get()
+    if stats is not None:
+        stats.llm_seconds += elapsed
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in (PROFILE_SLOW_MS > 0) wall-clock sampler. A daemon thread
+    snapshots every thread's stack each PROFILE_INTERVAL_MS into a short
+    ring buffer; when a request exceeds the threshold, the samples taken
+    during it are folded into a top-stacks report and logged. The stacks
+    are process-wide, so concurrent requests show up too.
+    """
+
+    def __init__(self, slow_ms: float | None = None, interval_ms: float | None = None):
+        self.slow = (slow_ms if slow_ms is not None else settings.profile_slow_ms) / 1000
+        self.interval = (interval_ms or settings.profile_interval_ms) / 1000
+        self._samples: deque = deque(maxlen=int(60 / self.interval))
+        self._thread: threading.Thread | None = None
+        self.reports: deque = deque(maxlen=20)
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow > 0
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = ";".join(
+                    f"{os.path.basename(f.filename)}:{f.name}"
+                    for f in traceback.extract_stack(frame, limit=25)
+                )
+                self._samples.append((now, stack))
+            time.sleep(self.interval)
+
+    def check(self, method: str, route: str, started: float, ended: float):
+        if not self.enabled or ended - started < self.slow:
+            return
+        tally = Tally(stack for t, stack in list(self._samples) if started <= t <= ended)
+        report = {
+            "route": f"{method} {route}",
+            "ms": round((ended - started) * 1000, 1),
+            "top": tally.most_common(5),
+        }
+        self.reports.append(report)
+        log.warning("slow request %s took %.1f ms; top stacks: %s", report["route"], report["ms"], report["top"])
+
+
+profiler = SlowRequestProfiler()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI so streaming responses are timed to their last byte. Adds a
+    Server-Timing header (total, db, llm so far) to every response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route(self, scope) -> str:
+        # the template, not the raw path, keeps label cardinality bounded
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        stats = RequestStats(route)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        http_in_flight.inc(method, route)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = stats.server_timing(time.perf_counter() - started).encode()
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"server-timing", timing)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ended = time.perf_counter()
+            http_in_flight.dec(method, route)
+            http_requests.inc(method, route, status)
+            http_latency.observe(ended - started, method, route)
+            db_queries.observe(stats.db_count, route)
+            current_request.reset(token)
+            profiler.check(method, route, started, ended)
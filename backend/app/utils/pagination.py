@@ -0,0 +1,77 @@
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _expected_type(col):
+    """What a cursor value for `col` may be; any scalar if the column type can't tell."""
+    try:
+        python_type = col.type.python_type
+    except (AttributeError, NotImplementedError):
+        return (int, float, str)
+    if python_type is float:
+        return (int, float)
+    if python_type in (int, str):
+        return python_type
+    return (int, float, str)
+
+
+def decode_cursor(cursor: str, order) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(order):
+        raise HTTPException(400, "Invalid cursor")
+    for value, (col, _) in zip(values, order):
+        # sort keys are never NULL, and bool is an int to isinstance
+        if isinstance(value, bool) or not isinstance(value, _expected_type(col)):
+            raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def _after(order, values):
+    # (a, b, c) > (x, y, z) spelled out so mixed ASC/DESC keys work everywhere
+    clauses = []
+    for i, (col, desc) in enumerate(order):
+        prefix = [c == v for (c, _), v in zip(order[:i], values[:i])]
+        step = col < values[i] if desc else col > values[i]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+
+def keyset_page(q, order, cursor: str | None, limit: int, key=None):
+    """
+    Keyset pagination over `q`.
+
+    order  -- list of (column, descending) pairs; the last one must be unique
+    cursor -- opaque token from a previous page ("" or None for the first page)
+    key    -- row -> list of sort values (default: the order columns read off
+              the row by attribute name)
+
+    Returns (rows, next_cursor).
+    """
+    if cursor:
+        q = q.filter(_after(order, decode_cursor(cursor, order)))
+    q = q.order_by(*(col.desc() if desc else col.asc() for col, desc in order))
+    rows = q.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if key is None:
+            values = [getattr(rows[-1], col.key) for col, _ in order]
+        else:
+            values = key(rows[-1])
+        next_cursor = encode_cursor(values)
+    return rows, next_cursor
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from pydantic import ValidationError, parse_obj_as
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.session import AsyncSessionLocal
+from ..models.culture import Culture
+from ..models.quiz_set import QuizSet
+from ..schemas.quiz import QuizItem
+from .leases import claim, release
+from .llm import get_llm
+from .retrieval import culture_context
+
+log = logging.getLogger(__name__)
+
+SOURCE_FIELDS = (
+    "name", "region", "location", "population", "language",
+    "about", "traditions", "lifestyle",
+)
+
+
+def content_hash(culture) -> str:
+    source = json.dumps([getattr(culture, f) for f in SOURCE_FIELDS], ensure_ascii=False)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+QUIZ_TOPICS = "history traditions customs ceremonies lifestyle food language beliefs"
+
+
+def quiz_prompt(culture) -> str:
+    notes = culture_context(culture, f"{culture.name} {QUIZ_TOPICS}")
+    return (
+        f"Generate 5 multiple choice questions (4 options each) based on:\n"
+        + "\n".join(notes) + "\n"
+        "Return JSON: { \"questions\": [ { \"id\":1, \"question\":\"...\", \"options\":{A:\"..\",B:\"..\",C:\"..\",D:\"..\"}, \"correct\":\"A\" }, ... ] }"
+    )
+
+
+async def generate_items(culture) -> list[dict]:
+    """One LLM call; raises on upstream/parse/validation errors."""
+    prompt = await asyncio.to_thread(quiz_prompt, culture)
+    resp = await get_llm().chat(
+        [
+            {"role": "system", "content": "You are a helpful quiz generator."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.7,
+        max_tokens=800,
+    )
+    questions = json.loads(resp.content).get("questions", [])
+    items = parse_obj_as(list[QuizItem], questions)
+    if not items:
+        raise ValueError("no questions in LLM output")
+    return [i.dict() for i in items]
+
+
+async def pick_warm_set(db: AsyncSession, culture_id: int, digest: str) -> list[dict] | None:
+    row = (
+        await db.execute(
+            select(QuizSet.items)
+            .where(QuizSet.culture_id == culture_id, QuizSet.content_hash == digest)
+            .order_by(func.random())
+            .limit(1)
+        )
+    ).first()
+    return row[0] if row else None
+
+
+async def store_set(db: AsyncSession, culture_id: int, digest: str, items: list[dict]):
+    db.add(QuizSet(culture_id=culture_id, content_hash=digest, items=items))
+    await db.commit()
+
+
+async def generate_and_store(culture, digest: str) -> list[dict]:
+    """Cold-miss path; the bank keeps the set if it has room for it."""
+    items = await generate_items(culture)
+    await quiz_bank_worker.offer(culture.id, digest, items)
+    return items
+
+
+class QuizBankWorker:
+    """
+    Keeps QUIZ_BANK_SIZE sets per culture warm for the current content hash.
+    Sweeps the whole catalog every QUIZ_BANK_INTERVAL seconds and reacts
+    immediately to cultures enqueued by the write routes. Every worker
+    runs one; a culture is only filled by the worker holding its lease,
+    and every set, including ones kept from a cold miss, is stored
+    under that lease after counting the bank.
+    """
+
+    def __init__(self, sets_per_culture: int | None = None, interval: float | None = None):
+        self.sets_per_culture = (
+            sets_per_culture if sets_per_culture is not None
+            else settings.quiz_bank_size
+        )
+        self.interval = interval or settings.quiz_bank_interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.sets_per_culture <= 0 or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, culture_id: int):
+        """Safe to call from sync routes running in the threadpool."""
+        if self._loop is not None and self._queue is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, culture_id)
+
+    async def _sweep(self):
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(select(Culture.id))).scalars().all()
+        for culture_id in ids:
+            self._queue.put_nowait(culture_id)
+
+    async def _run(self):
+        await self._sweep()
+        while True:
+            try:
+                culture_id = await asyncio.wait_for(self._queue.get(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                await self._sweep()
+                continue
+            try:
+                await self.warm(culture_id)
+            except Exception as e:
+                log.warning("quiz bank: warming culture %s failed: %s", culture_id, e)
+
+    async def warm(self, culture_id: int):
+        lease = f"quiz_bank:{culture_id}"
+        async with AsyncSessionLocal() as db:
+            if not await claim(db, lease, settings.quiz_bank_lease):
+                return  # another worker is filling this one
+            try:
+                await self._fill(db, culture_id)
+            finally:
+                await db.rollback()
+                await release(db, lease)
+
+    async def offer(self, culture_id: int, digest: str, items: list[dict]) -> bool:
+        """Keep a set generated outside the worker (a cold miss) if the bank has room."""
+        lease = f"quiz_bank:{culture_id}"
+        async with AsyncSessionLocal() as db:
+            if not await claim(db, lease, settings.quiz_bank_lease):
+                return False  # whoever holds it is filling the bank anyway
+            try:
+                return await self._store_if_room(db, culture_id, digest, items)
+            finally:
+                await db.rollback()
+                await release(db, lease)
+
+    async def _store_if_room(self, db: AsyncSession, culture_id: int, digest: str, items: list[dict]) -> bool:
+        """Caller holds the culture's lease, so the count can't go stale before the insert."""
+        have = (
+            await db.execute(
+                select(func.count(QuizSet.id)).where(
+                    QuizSet.culture_id == culture_id, QuizSet.content_hash == digest
+                )
+            )
+        ).scalar_one()
+        if have >= self.sets_per_culture:
+            return False
+        await store_set(db, culture_id, digest, items)
+        return True
+
+    async def _fill(self, db: AsyncSession, culture_id: int):
+        culture = await db.get(Culture, culture_id)
+        if culture is None:
+            return
+        digest = content_hash(culture)
+        # sets generated from older text are never served again
+        await db.execute(
+            delete(QuizSet).where(
+                QuizSet.culture_id == culture_id, QuizSet.content_hash != digest
+            )
+        )
+        await db.commit()
+        have = (
+            await db.execute(
+                select(func.count(QuizSet.id)).where(
+                    QuizSet.culture_id == culture_id, QuizSet.content_hash == digest
+                )
+            )
+        ).scalar_one()
+        for _ in range(self.sets_per_culture - have):
+            try:
+                items = await generate_items(culture)
+            except (ValueError, ValidationError) as e:
+                log.info("quiz bank: discarding bad generation for %s: %s", culture.slug, e)
+                continue
+            await self._store_if_room(db, culture_id, digest, items)
+
+quiz_bank_worker = QuizBankWorker()
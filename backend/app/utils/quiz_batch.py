@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from pydantic import ValidationError, parse_obj_as
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.session import AsyncSessionLocal
+from ..models.culture import Culture
+from ..models.quiz_job import QuizJob
+from ..models.quiz_set import QuizSet
+from ..schemas.quiz import QuizItem
+from .leases import WORKER_ID, lease_expiry
+from .llm import LLMError, get_llm
+from .quiz_bank import QUIZ_TOPICS, SOURCE_FIELDS, content_hash
+from .retrieval import culture_context
+
+log = logging.getLogger(__name__)
+
+CULTURES_PER_CALL = settings.quiz_batch_cultures
+CONCURRENCY = settings.quiz_batch_concurrency
+# per culture; the whole prompt is CULTURES_PER_CALL times this
+NOTES_BUDGET = settings.quiz_batch_notes_budget
+TOKENS_PER_QUIZ = 700
+BATCH_MODEL = settings.quiz_batch_model
+# model families that accept a strict json_schema response_format,
+# minus the snapshots in them that predate it
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+NO_STRUCTURED_OUTPUT = ("gpt-4o-2024-05-13", "o1-mini", "o1-preview")
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "question": {"type": "string"},
+        "options": {
+            "type": "object",
+            "properties": {k: {"type": "string"} for k in "ABCD"},
+            "required": list("ABCD"),
+            "additionalProperties": False,
+        },
+        "correct": {"type": "string", "enum": list("ABCD")},
+    },
+    "required": ["id", "question", "options", "correct"],
+    "additionalProperties": False,
+}
+
+
+def batch_schema(slugs: list[str]) -> dict:
+    """Strict structured-output schema: exactly one question list per slug."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "quiz_batch",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {s: {"type": "array", "items": QUESTION_SCHEMA} for s in slugs},
+                "required": slugs,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def supports_structured_output(model: str) -> bool:
+    return model.startswith(STRUCTURED_OUTPUT_MODELS) and not model.startswith(NO_STRUCTURED_OUTPUT)
+
+
+def batch_format(model: str, slugs: list[str]) -> dict:
+    """The strict schema where the model takes it, else JSON mode (split_batch validates)."""
+    if supports_structured_output(model):
+        return batch_schema(slugs)
+    return {"type": "json_object"}
+
+
+def batch_prompt(cultures) -> str:
+    parts = [
+        "For EACH culture below generate 5 multiple choice questions (4 options each), "
+        "using only its own notes. Return one JSON object keyed by the culture key: "
+        '{ "<key>": [ { "id":1, "question":"...", "options":{A:"..",B:"..",C:"..",D:".."}, "correct":"A" }, ... ], ... }'
+    ]
+    for c in cultures:
+        notes = culture_context(c, f"{c.name} {QUIZ_TOPICS}", budget=NOTES_BUDGET)
+        parts.append(f"### key: {c.slug}\n" + "\n".join(notes))
+    return "\n\n".join(parts)
+
+
+def split_batch(content: str, slugs: list[str]) -> tuple[dict[str, list[dict]], dict[str, str]]:
+    """Validate a batch answer; returns (items per slug, error per slug)."""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}, {s: "LLM returned invalid JSON" for s in slugs}
+    if not isinstance(data, dict):
+        return {}, {s: "LLM returned a non-object" for s in slugs}
+    ok, errors = {}, {}
+    for slug in slugs:
+        try:
+            items = parse_obj_as(list[QuizItem], data.get(slug) or [])
+        except ValidationError as e:
+            errors[slug] = f"invalid questions: {e.errors()[0]['msg']}"
+            continue
+        if not items:
+            errors[slug] = "no questions in LLM output"
+            continue
+        ok[slug] = [i.dict() for i in items]
+    return ok, errors
+
+
+async def generate_batch(cultures) -> tuple[dict[str, list[dict]], dict[str, str]]:
+    slugs = [c.slug for c in cultures]
+    prompt = await asyncio.to_thread(batch_prompt, cultures)
+    try:
+        resp = await get_llm().chat(
+            [
+                {"role": "system", "content": "You are a helpful quiz generator."},
+                {"role": "user", "content": prompt},
+            ],
+            model=BATCH_MODEL,
+            temperature=0.7,
+            max_tokens=TOKENS_PER_QUIZ * len(cultures),
+            response_format=batch_format(BATCH_MODEL, slugs),
+        )
+    except LLMError as e:
+        return {}, {s: str(e) for s in slugs}
+    return split_batch(resp.content, slugs)
+
+
+async def stale_slugs(db: AsyncSession) -> list[str]:
+    """Cultures with no stored set for their current text."""
+    have = set(
+        (await db.execute(select(QuizSet.culture_id, QuizSet.content_hash).distinct())).all()
+    )
+    rows = await db.execute(
+        select(Culture.id, Culture.slug, *(getattr(Culture, f) for f in SOURCE_FIELDS))
+        .order_by(Culture.id)
+    )
+    return [r.slug for r in rows if (r.id, content_hash(r)) not in have]
+
+
+class QuizBatchRunner:
+    """
+    Runs QuizJobs in the background: packs CULTURES_PER_CALL cultures into
+    each LLM call, keeps CONCURRENCY calls in flight and commits every
+    finished batch (sets + job progress) as it lands. A job interrupted by
+    a restart or left with failures resumes from the slugs not yet done.
+
+    Every worker resumes interrupted jobs at startup, so a job is first
+    claimed with a conditional UPDATE of its owner/lease columns; only the
+    worker holding the lease runs it, and each recorded batch renews it.
+    """
+
+    def __init__(self, per_call: int = CULTURES_PER_CALL, concurrency: int = CONCURRENCY):
+        self.per_call = max(1, per_call)
+        self.concurrency = max(1, concurrency)
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._write_lock = asyncio.Lock()
+
+    async def create(self, db: AsyncSession, slugs: list[str] | None, stale: bool) -> QuizJob:
+        targets = list(dict.fromkeys(slugs or []))
+        if stale:
+            targets += [s for s in await stale_slugs(db) if s not in targets]
+        job = QuizJob(status="pending" if targets else "done", slugs=targets, done=[], failed={})
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    def start(self, job_id: int):
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self.run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def running(self, job_id: int) -> bool:
+        return job_id in self._tasks
+
+    @staticmethod
+    def leased(job: QuizJob) -> bool:
+        """Held by some worker (possibly another one) right now."""
+        return job.owner is not None and job.lease_expires_at is not None and job.lease_expires_at > datetime.utcnow()
+
+    async def _claim(self, db: AsyncSession, job_id: int) -> bool:
+        claimed = await db.execute(
+            update(QuizJob)
+            .where(
+                QuizJob.id == job_id,
+                QuizJob.status != "done",
+                or_(
+                    QuizJob.owner.is_(None),
+                    QuizJob.owner == WORKER_ID,
+                    QuizJob.lease_expires_at < datetime.utcnow(),
+                ),
+            )
+            .values(owner=WORKER_ID, lease_expires_at=lease_expiry(settings.quiz_batch_lease), status="running")
+        )
+        await db.commit()
+        return bool(claimed.rowcount)
+
+    async def resume_interrupted(self):
+        async with AsyncSessionLocal() as db:
+            ids = (
+                await db.execute(
+                    select(QuizJob.id).where(
+                        QuizJob.status.in_(("pending", "running")),
+                        or_(QuizJob.owner.is_(None), QuizJob.lease_expires_at < datetime.utcnow()),
+                    )
+                )
+            ).scalars().all()
+        # run() claims each job first, so a job several workers see here runs once
+        for job_id in ids:
+            self.start(job_id)
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        # cancelled jobs stay "running" and are picked up again once their lease expires
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            if not await self._claim(db, job_id):
+                return
+        try:
+            await self._run(job_id)
+        except Exception as e:
+            log.exception("quiz job %s crashed", job_id)
+            async with AsyncSessionLocal() as db:
+                job = await db.get(QuizJob, job_id)
+                if job is not None and job.owner == WORKER_ID:
+                    job.failed = {
+                        **{s: f"job failed: {e}" for s in job.slugs if s not in job.done},
+                        **job.failed,
+                    }
+                    job.status = "failed"
+                    job.owner = job.lease_expires_at = None
+                    await db.commit()
+
+    async def _run(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(QuizJob, job_id)
+            if job is None:
+                return
+            done = set(job.done)
+            remaining = [s for s in job.slugs if s not in done]
+            cultures = (
+                await db.execute(select(Culture).where(Culture.slug.in_(remaining)))
+            ).scalars().all()
+            job.failed = {
+                s: "culture not found" for s in set(remaining) - {c.slug for c in cultures}
+            }
+            await db.commit()
+
+        by_slug = {c.slug: c for c in cultures}
+        ordered = [by_slug[s] for s in remaining if s in by_slug]
+        batches = [ordered[i:i + self.per_call] for i in range(0, len(ordered), self.per_call)]
+        sem = asyncio.Semaphore(self.concurrency)
+        lost = asyncio.Event()
+
+        async def one(batch):
+            async with sem:
+                if lost.is_set():
+                    return
+                try:
+                    ok, errors = await generate_batch(batch)
+                except Exception as e:
+                    log.exception("quiz job %s: batch failed", job_id)
+                    ok, errors = {}, {c.slug: f"generation failed: {e}" for c in batch}
+            if not await self._record(job_id, batch, ok, errors):
+                lost.set()
+
+        await asyncio.gather(*(one(b) for b in batches))
+        if lost.is_set():
+            log.warning("quiz job %s: lease taken over by another worker, stopping", job_id)
+            return
+
+        async with AsyncSessionLocal() as db:
+            job = await db.get(QuizJob, job_id)
+            job.status = "failed" if job.failed else "done"
+            job.owner = job.lease_expires_at = None
+            await db.commit()
+            log.info("quiz job %s %s: %d/%d done", job_id, job.status, len(job.done), len(job.slugs))
+
+    async def _record(self, job_id: int, batch, ok: dict, errors: dict) -> bool:
+        """Store a finished batch and renew the lease; False once the job isn't ours."""
+        # one writer at a time: the job row's JSON progress is read-modify-write
+        async with self._write_lock, AsyncSessionLocal() as db:
+            job = await db.get(QuizJob, job_id)
+            if job is None or job.owner != WORKER_ID:
+                return False
+            for culture in batch:
+                if culture.slug not in ok:
+                    continue
+                digest = content_hash(culture)
+                await db.execute(
+                    delete(QuizSet).where(
+                        QuizSet.culture_id == culture.id, QuizSet.content_hash != digest
+                    )
+                )
+                db.add(QuizSet(culture_id=culture.id, content_hash=digest, items=ok[culture.slug]))
+            job.done = job.done + [s for s in ok if s not in job.done]
+            job.failed = {**{s: e for s, e in job.failed.items() if s not in ok}, **errors}
+            job.lease_expires_at = lease_expiry(settings.quiz_batch_lease)
+            await db.commit()
+        for slug, error in errors.items():
+            log.info("quiz job %s: %s failed: %s", job_id, slug, error)
+        return True
+
+quiz_batch_runner = QuizBatchRunner()
@@ -0,0 +1,307 @@
+import math
+import re
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from ..config import settings
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+TEXT_FIELDS = ("about", "traditions", "lifestyle")
+TOKEN_BUDGET = settings.rag_token_budget
+# general chat only gets other cultures' notes when they're clearly on topic
+MIN_GENERAL_SCORE = settings.rag_min_score
+# share of rows added/removed since the IDF was last applied that triggers a re-weighting
+REWEIGHT_RATIO = 0.1
+
+
+@lru_cache(maxsize=1 << 18)
+def _term_hash(term: str) -> int:
+    return zlib.crc32(term.encode())
+
+
+def estimate_tokens(text: str) -> int:
+    # ~1.3 tokens per English word is close enough for budgeting
+    return math.ceil(len(text.split()) * 1.3)
+
+
+def chunk_culture(culture, words_per_chunk: int = 80, overlap: int = 15) -> list[str]:
+    """A short facts chunk plus overlapping word windows over the long texts."""
+    facts = [f"{culture.name} culture."]
+    for label, value in (
+        ("Region", culture.region), ("Location", culture.location),
+        ("Language", culture.language), ("Population", culture.population),
+    ):
+        if value:
+            facts.append(f"{label}: {value}.")
+    chunks = [" ".join(facts)]
+
+    step = words_per_chunk - overlap
+    for field in TEXT_FIELDS:
+        words = (getattr(culture, field, None) or "").split()
+        for start in range(0, len(words), step):
+            window = words[start:start + words_per_chunk]
+            chunks.append(f"{field.capitalize()}: " + " ".join(window))
+            if start + words_per_chunk >= len(words):
+                break
+    return chunks
+
+
+class VectorIndex:
+    """
+    CPU-only retrieval over culture text chunks.
+
+    Chunks are embedded with the hashing trick (signed, sublinear TF over
+    words and word bigrams, crc32-based so it is stable across processes) into a
+    float32 matrix. Rows are stored IDF-weighted and L2-normalised, and each
+    culture's rows are contiguous, so a query is a single matrix-vector
+    product over one slice. The IDF comes from a running document-frequency
+    vector: upserts reuse the current one, so adding/removing one culture
+    never means re-embedding the others, and all rows are re-weighted once
+    REWEIGHT_RATIO of the index has changed since.
+    """
+
+    def __init__(self, dim: int | None = None):
+        self.dim = dim or settings.rag_dim
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._df = np.zeros(self.dim, dtype=np.float32)
+        self._idf = np.ones(self.dim, dtype=np.float32)
+        self._owners = np.zeros(0, dtype=object)      # culture slug per row
+        self._texts: list[str] = []
+        self._spans: dict[str, tuple[int, int]] = {}  # slug -> its rows, in row order
+        self._changed = 0                             # rows added/removed since the last weighting
+        self._pending: list | None = None             # writes made while a rebuild runs
+
+    def __len__(self):
+        return len(self._texts)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list[str], block: int = 2048) -> np.ndarray:
+        """
+        Embed many chunks with a few array ops per block instead of a
+        Python loop per term. Bigram hashes are mixed from the two word
+        hashes, so only words go through the (cached) crc32.
+        """
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), block):
+            part = texts[start:start + block]
+            lengths, hashes = [], []
+            for text in part:
+                words = _WORD_RE.findall(text.lower())
+                lengths.append(len(words))
+                hashes.extend(map(_term_hash, words))
+            if not hashes:
+                continue
+            h = np.array(hashes, dtype=np.uint64)
+            rows = np.repeat(np.arange(len(part)), lengths)
+            same = rows[1:] == rows[:-1]
+            bigrams = (((h[:-1] * 0x01000193) ^ h[1:]) & 0xFFFFFFFF)[same]
+            h = np.concatenate([h, bigrams])
+            rows = np.concatenate([rows, rows[1:][same]])
+            signs = np.where(h & 0x80000000, 1.0, -1.0)
+            counts = np.bincount(
+                rows * self.dim + (h % self.dim).astype(np.int64),
+                weights=signs, minlength=len(part) * self.dim,
+            ).reshape(len(part), self.dim)
+            # sign(c) * (1 + log|c|) for c != 0, without boolean-mask copies
+            mag = np.abs(counts)
+            nz = mag > 0
+            np.log(mag, out=mag, where=nz)
+            mag += nz
+            out[start:start + len(part)] = np.copysign(mag, counts)
+        return out
+
+    @staticmethod
+    def _idf_for(df: np.ndarray, n: int) -> np.ndarray:
+        return (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """In place; rows that are all zero stay zero."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors
+
+    def _reweight(self):
+        # rows are normalize(tf * old_idf), so scaling by new/old and
+        # normalising again gives normalize(tf * new_idf)
+        idf = self._idf_for(self._df, len(self._texts))
+        self._matrix *= idf / self._idf
+        self._normalize(self._matrix)
+        self._idf = idf
+        self._changed = 0
+
+    def _drop(self, *slugs: str):
+        dropped = {s for s in slugs if s in self._spans}
+        if not dropped:
+            return
+        keep = np.ones(len(self._texts), dtype=bool)
+        for slug in dropped:
+            start, stop = self._spans[slug]
+            keep[start:stop] = False
+        self._df -= (self._matrix[~keep] != 0).sum(axis=0)
+        self._changed += len(keep) - int(keep.sum())
+        self._matrix = self._matrix[keep]
+        self._owners = self._owners[keep]
+        self._texts = [t for t, k in zip(self._texts, keep) if k]
+        spans, offset = {}, 0
+        for slug, (start, stop) in self._spans.items():
+            if slug not in dropped:
+                spans[slug] = (offset, offset + stop - start)
+                offset += stop - start
+        self._spans = spans
+
+    def _add(self, pairs: list[tuple[str, str]]):
+        """pairs: (slug, chunk), grouped by slug; appended with a single vstack."""
+        if not pairs:
+            return
+        vectors = self.embed_many([chunk for _, chunk in pairs])
+        self._df += (vectors != 0).sum(axis=0)
+        for row, (slug, _) in enumerate(pairs, len(self._texts)):
+            start = self._spans[slug][0] if slug in self._spans else row
+            self._spans[slug] = (start, row + 1)
+        self._matrix = np.vstack([self._matrix, self._normalize(vectors * self._idf)])
+        self._owners = np.concatenate([self._owners, np.array([s for s, _ in pairs], dtype=object)])
+        self._texts.extend(chunk for _, chunk in pairs)
+        self._changed += len(pairs)
+        if self._changed > REWEIGHT_RATIO * len(self._texts):
+            self._reweight()
+
+    def rebuild(self, cultures):
+        """
+        Embeds outside the lock, so searches keep answering (from the old
+        contents) during a long build; writes made meanwhile are replayed
+        on top of the new contents when they are swapped in.
+        """
+        with self._lock:
+            self._pending = []
+        try:
+            texts, owners, spans = [], [], {}
+            for culture in cultures:
+                chunks = chunk_culture(culture)
+                spans[culture.slug] = (len(texts), len(texts) + len(chunks))
+                owners.extend([culture.slug] * len(chunks))
+                texts.extend(chunks)
+            matrix = self.embed_many(texts)
+            df = (matrix != 0).sum(axis=0).astype(np.float32)
+            idf = self._idf_for(df, len(texts))
+            matrix *= idf
+            self._normalize(matrix)
+            owners = np.array(owners, dtype=object)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._matrix, self._df, self._idf = matrix, df, idf
+            self._owners, self._texts, self._spans = owners, texts, spans
+            self._changed = 0
+            pending, self._pending = self._pending, None
+            for slugs, pairs in pending:
+                self._drop(*slugs)
+                self._add(pairs)
+
+    def _write(self, slugs, pairs):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((slugs, pairs))
+            self._drop(*slugs)
+            self._add(pairs)
+
+    def upsert(self, culture, old_slug: str | None = None):
+        pairs = [(culture.slug, chunk) for chunk in chunk_culture(culture)]
+        self._write((old_slug or culture.slug, culture.slug), pairs)
+
+    def upsert_many(self, cultures):
+        """Batch upsert (bulk import): one drop and one append for the lot."""
+        cultures = list({c.slug: c for c in cultures}.values())
+        pairs = [(c.slug, chunk) for c in cultures for chunk in chunk_culture(c)]
+        self._write([c.slug for c in cultures], pairs)
+
+    def remove(self, slug: str):
+        self._write((slug,), [])
+
+    def sync(self, cultures):
+        """
+        Bring the index in line with `cultures` (the whole catalog), e.g.
+        after another worker wrote: only cultures whose chunks changed are
+        re-embedded, and ones no longer listed are dropped.
+        """
+        with self._lock:
+            indexed = {slug: self._texts[start:stop] for slug, (start, stop) in self._spans.items()}
+        changed, pairs = [], []
+        for culture in cultures:
+            chunks = chunk_culture(culture)
+            if indexed.pop(culture.slug, None) != chunks:
+                changed.append(culture.slug)
+                pairs.extend((culture.slug, chunk) for chunk in chunks)
+        if changed or indexed:
+            self._write([*changed, *indexed], pairs)
+
+    def is_current(self, slug: str, chunks: list[str]) -> bool:
+        """Whether the rows for `slug` were built from exactly these chunks."""
+        with self._lock:
+            start, stop = self._spans.get(slug, (0, 0))
+            return self._texts[start:stop] == chunks
+
+    def search(self, query: str, slug: str | None = None, k: int = 4, min_score: float = 0.0):
+        """Top-k (score, slug, text), optionally restricted to one culture."""
+        q = self.embed(query)
+        with self._lock:
+            start, stop = (0, len(self._texts)) if slug is None else self._spans.get(slug, (0, 0))
+            qw = q * self._idf
+            norm = np.linalg.norm(qw)
+            if start == stop or not norm:
+                return []
+            scores = self._matrix[start:stop] @ (qw / norm)
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [
+                (float(scores[i]), self._owners[start + i], self._texts[start + i])
+                for i in top
+                if scores[i] > min_score
+            ]
+
+    def context(self, query: str, slug: str | None = None, budget: int = TOKEN_BUDGET,
+                k: int = 8, min_score: float = 0.0, skip: int = 0) -> list[str]:
+        """Most relevant chunks, best first, that fit in `budget` tokens."""
+        picked, used = [], skip
+        for _, _, text in self.search(query, slug, k, min_score):
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                continue
+            picked.append(text)
+            used += cost
+        return picked
+
+
+vector_index = VectorIndex()
+
+
+def culture_context(culture, query: str, budget: int = TOKEN_BUDGET) -> list[str]:
+    """
+    Facts line for `culture` plus its chunks most relevant to `query`,
+    within `budget` tokens. Falls back to chunking on the spot if the
+    index doesn't hold the culture as it is now (not built yet, or
+    another worker changed it and this one hasn't synced).
+    """
+    chunks = chunk_culture(culture)
+    facts, *rest = chunks
+    notes = []
+    if vector_index.is_current(culture.slug, chunks):
+        notes = [c for c in vector_index.context(query, culture.slug, budget, skip=estimate_tokens(facts))
+                 if c != facts]
+    if not notes and rest:
+        used = estimate_tokens(facts)
+        for chunk in rest:
+            cost = estimate_tokens(chunk)
+            if used + cost > budget:
+                break
+            notes.append(chunk)
+            used += cost
+    return [facts, *notes]
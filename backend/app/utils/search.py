@@ -0,0 +1,113 @@
+import re
+
+from sqlalchemy import Float, cast, column, false, func, literal_column, or_, table, text
+from sqlalchemy.orm import Query, Session
+
+from ..models.culture import Culture
+
+# Field weights: name/slug > region/language/location > long body text.
+# Postgres keeps a generated tsvector column on `cultures` (GIN indexed),
+# SQLite keeps an external-content FTS5 table synced by triggers, so the
+# search document follows every INSERT/UPDATE/DELETE without app code.
+
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(slug, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(region, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(language, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(about, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(traditions, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(lifestyle, '')), 'C')"
+)
+
+PG_DDL = [
+    "ALTER TABLE cultures ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({PG_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_cultures_search_vector "
+    "ON cultures USING GIN (search_vector)",
+]
+
+FTS_COLUMNS = [
+    "name", "slug", "region", "language", "location",
+    "about", "traditions", "lifestyle",
+]
+FTS_WEIGHTS = [10.0, 10.0, 4.0, 4.0, 4.0, 1.0, 1.0, 1.0]
+
+_cols = ", ".join(FTS_COLUMNS)
+_new = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+_old = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS culture_fts USING fts5({_cols}, "
+    "content='cultures', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS cultures_fts_ai AFTER INSERT ON cultures BEGIN "
+    f"INSERT INTO culture_fts(rowid, {_cols}) VALUES (new.id, {_new}); END",
+    "CREATE TRIGGER IF NOT EXISTS cultures_fts_ad AFTER DELETE ON cultures BEGIN "
+    f"INSERT INTO culture_fts(culture_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old}); END",
+    "CREATE TRIGGER IF NOT EXISTS cultures_fts_au AFTER UPDATE ON cultures BEGIN "
+    f"INSERT INTO culture_fts(culture_fts, rowid, {_cols}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO culture_fts(rowid, {_cols}) VALUES (new.id, {_new}); END",
+]
+
+culture_fts = table("culture_fts", column("rowid"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query: str) -> list[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(query)][:16]
+
+
+def ensure_search_index(engine):
+    """Create the search document + index for the current dialect (idempotent)."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            for stmt in PG_DDL:
+                conn.execute(text(stmt))
+        elif dialect == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'culture_fts'")
+            ).first()
+            for stmt in SQLITE_DDL:
+                conn.execute(text(stmt))
+            if not exists:
+                # index rows that were there before the FTS table
+                conn.execute(text("INSERT INTO culture_fts(culture_fts) VALUES ('rebuild')"))
+
+
+def apply_search(q: Query, db: Session, query: str):
+    """
+    Filter `q` (a query over Culture) to rows matching `query` with prefix
+    matching on every token. Returns (query, rank) where higher rank is better.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return q.filter(false()), literal_column("0")
+
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        tsq = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in tokens))
+        vector = literal_column("cultures.search_vector")
+        rank = cast(func.ts_rank_cd(vector, tsq), Float)
+        return q.filter(vector.op("@@")(tsq)), rank
+
+    if dialect == "sqlite":
+        fts = literal_column("culture_fts")
+        match = " ".join(f'"{t}"*' for t in tokens)
+        q = (
+            q.join(culture_fts, culture_fts.c.rowid == Culture.id)
+            .filter(fts.op("MATCH")(match))
+        )
+        # bm25() is "lower is better"
+        rank = -func.bm25(fts, *FTS_WEIGHTS)
+        return q, rank
+
+    # unknown dialect: plain substring scan, unranked
+    clauses = []
+    for t in tokens:
+        term = f"%{t}%"
+        clauses.append(or_(*(getattr(Culture, c).ilike(term) for c in FTS_COLUMNS)))
+    return q.filter(*clauses), literal_column("0")
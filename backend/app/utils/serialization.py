@@ -0,0 +1,35 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    """orjson with schema instances encoded via .dict() instead of jsonable_encoder."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class TrustedJSONResponse(ORJSONResponse):
+    """
+    For content that already has the response_model's shape: schema
+    instances built with from_orm, or dicts of typed columns. Returning a
+    Response skips FastAPI's second validation and its jsonable_encoder
+    walk; response_model on the route still documents the shape.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def orm_response(schema, obj, status_code: int = 200) -> TrustedJSONResponse:
+    """Validate ORM rows through `schema` once and encode the result directly."""
+    if isinstance(obj, list):
+        content = [schema.from_orm(o) for o in obj]
+    else:
+        content = schema.from_orm(obj)
+    return TrustedJSONResponse(content, status_code=status_code)
@@ -0,0 +1,56 @@
+import asyncio
+import re
+from collections import defaultdict
+
+from .metrics import registry
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_prompt(text: str) -> str:
+    """Case/punctuation/whitespace folding so trivially different prompts share a key."""
+    return " ".join(_PUNCT_RE.sub(" ", text.casefold()).split())
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical async calls into one.
+
+    The first caller for a key starts the work as its own task; everyone
+    arriving while it runs awaits that same task. The task is shielded, so
+    one client disconnecting doesn't cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self.stats: dict[str, dict[str, int]] = defaultdict(lambda: {"issued": 0, "coalesced": 0})
+
+    async def do(self, key: tuple, fn):
+        endpoint = str(key[0])
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats[endpoint]["issued"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats[endpoint]["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        return {k: dict(v) for k, v in self.stats.items()}
+
+
+llm_flight = SingleFlight()
+
+
+@registry.collector
+def _flight_metrics() -> list[str]:
+    lines = [
+        "# HELP llm_singleflight_total LLM calls issued vs. coalesced onto an in-flight call.",
+        "# TYPE llm_singleflight_total counter",
+    ]
+    for endpoint, counts in llm_flight.snapshot().items():
+        for kind, n in counts.items():
+            lines.append(f'llm_singleflight_total{{endpoint="{endpoint}",kind="{kind}"}} {n}')
+    return lines
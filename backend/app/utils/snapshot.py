@@ -0,0 +1,279 @@
+"""
+Static snapshot of the read-only catalog, for serving from static hosting
+or a CDN instead of the API:
+
+    python -m app.utils.snapshot [--out DIR]
+
+Layout under SNAPSHOT_DIR:
+
+    manifest.json                 logical name -> file, written last
+    cultures/<slug>.<hash>.json   CultureOut, as GET /api/cultures/{slug}
+    cards/<n>.<hash>.json         CultureCard pages in name order (?view=card)
+    regions.<hash>.json           as GET /api/cultures/regions
+    map.<hash>.json               [slug, name, lat, lon] for every mapped culture
+    media.<hash>.json             MediaItemOut list, as GET /api/media/
+    search/<c>.<hash>.json        sorted [term, slug, name, region] rows for
+                                  the type-ahead terms starting with <c>
+
+Files are named by a hash of their content, so they can be cached forever,
+and content that didn't change keeps its name and is neither rewritten nor
+recompressed. Each file gets .gz (and .br with brotli installed) siblings.
+Every write is atomic (temp file + rename) and the manifest goes last, so
+a reader never sees it point at a missing file. Files referenced by
+neither the new nor the previous manifest are then removed.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+from ..config import settings
+from ..database.session import SessionLocal
+from ..models.culture import Culture
+from ..models.media_item import MediaItem
+from ..schemas.culture import CultureOut
+from ..schemas.media import MediaItemOut
+from .compression import ENCODINGS, STATIC_LEVELS, compress
+from .culture_views import CARD_FIELDS, culture_query, listing_query, shape_rows
+from .serialization import dumps
+from .suggest import SuggestIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+BATCH = 500
+
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class SnapshotBuilder:
+    def __init__(self, out: Path | None = None, page_size: int | None = None):
+        self.out = Path(out or settings.snapshot_dir)
+        self.page_size = page_size or settings.snapshot_page_size
+        self.written = 0
+        self.unchanged = 0
+        self._files: set[str] = set()
+
+    def _emit(self, stem: str, content) -> str:
+        body = dumps(content)
+        name = f"{stem}.{hashlib.sha256(body).hexdigest()[:16]}.json"
+        self._files.add(name)
+        path = self.out / name
+        if path.exists():
+            self.unchanged += 1
+            return name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # siblings first: once the .json exists, its encodings do too
+        for encoding in ENCODINGS:
+            _atomic_write(path.with_name(path.name + SUFFIXES[encoding]),
+                          compress(body, encoding, STATIC_LEVELS[encoding]))
+        _atomic_write(path, body)
+        self.written += 1
+        return name
+
+    def _cultures(self, db) -> dict[str, str]:
+        files, last_id = {}, 0
+        while True:
+            batch = (
+                culture_query(db).filter(Culture.id > last_id)
+                .order_by(Culture.id).limit(BATCH).all()
+            )
+            if not batch:
+                return files
+            for culture in batch:
+                files[culture.slug] = self._emit(
+                    f"cultures/{quote(culture.slug, safe='')}", CultureOut.from_orm(culture)
+                )
+            last_id = batch[-1].id
+            db.expunge_all()
+
+    def _cards(self, db) -> list[str]:
+        rows = listing_query(db, CARD_FIELDS).order_by(Culture.name, Culture.id).all()
+        cards = shape_rows(db, rows, CARD_FIELDS)
+        return [
+            self._emit(f"cards/{n}", cards[start:start + self.page_size])
+            for n, start in enumerate(range(0, max(len(cards), 1), self.page_size))
+        ]
+
+    def _search(self, db) -> dict[str, str]:
+        shards = defaultdict(list)
+        rows = db.query(Culture.slug, Culture.name, Culture.region, Culture.language)
+        for slug, name, region, language in rows:
+            for term in SuggestIndex._terms_for(slug, name, region, language):
+                shards[term[0]].append([term, slug, name, region])
+        return {
+            key: self._emit(f"search/{quote(key, safe='')}", sorted(rows))
+            for key, rows in sorted(shards.items())
+        }
+
+    def build(self) -> dict:
+        self.out.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            regions = sorted(
+                r for (r,) in db.query(Culture.region).filter(Culture.region.isnot(None)).distinct()
+            )
+            points = [
+                list(row) for row in
+                db.query(Culture.slug, Culture.name, Culture.latitude, Culture.longitude)
+                .filter(Culture.latitude.isnot(None), Culture.longitude.isnot(None))
+                .order_by(Culture.slug)
+            ]
+            media = [MediaItemOut.from_orm(m) for m in db.query(MediaItem).order_by(MediaItem.id)]
+            manifest = {
+                "version": 1,
+                "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "regions": self._emit("regions", regions),
+                "map": self._emit("map", points),
+                "media": self._emit("media", media),
+                "cards": self._cards(db),
+                "search": self._search(db),
+                "cultures": self._cultures(db),
+            }
+        finally:
+            db.close()
+
+        previous = self._referenced(self.out / MANIFEST)
+        body = dumps(manifest)
+        for encoding in ENCODINGS:
+            _atomic_write(self.out / (MANIFEST + SUFFIXES[encoding]), compress(body, encoding, STATIC_LEVELS[encoding]))
+        _atomic_write(self.out / MANIFEST, body)
+        removed = self._collect(self._files | previous)
+        log.info(
+            "snapshot: %d files written, %d unchanged, %d removed in %.0f ms",
+            self.written, self.unchanged, removed, (time.perf_counter() - started) * 1000,
+        )
+        return manifest
+
+    @staticmethod
+    def _referenced(manifest_path: Path) -> set[str]:
+        """Files the current manifest points at; readers may still hold it."""
+        try:
+            manifest = json.loads(manifest_path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return set()
+        files = {manifest["regions"], manifest["map"], manifest["media"], *manifest["cards"]}
+        files.update(manifest["search"].values())
+        files.update(manifest["cultures"].values())
+        return files
+
+    def _collect(self, keep: set[str]) -> int:
+        removed = 0
+        for sub in ("", "cultures", "cards", "search"):
+            folder = self.out / sub
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder):
+                if not entry.is_file() or entry.name.startswith((MANIFEST, ".")):
+                    continue
+                name = f"{sub}/{entry.name}" if sub else entry.name
+                base = name
+                for suffix in SUFFIXES.values():
+                    base = base.removesuffix(suffix)
+                if base.endswith(".json") and base not in keep:
+                    os.unlink(entry.path)
+                    removed += 1
+        return removed
+
+
+@contextmanager
+def _exclusive(out: Path, wait: bool):
+    """One builder at a time across workers; yields False if busy and not waiting."""
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / ".lock", "w") as lock:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def build_snapshot(out: Path | None = None, wait: bool = True) -> dict | None:
+    builder = SnapshotBuilder(out)
+    with _exclusive(builder.out, wait) as acquired:
+        return builder.build() if acquired else None
+
+
+class SnapshotWorker:
+    """
+    Rebuilds the snapshot in a background thread SNAPSHOT_DELAY seconds
+    after a write, so a burst of edits (or a bulk import) costs one build.
+    Only runs when SNAPSHOT_ON_WRITE is set.
+    """
+
+    def __init__(self, delay: float | None = None):
+        self.delay = delay if delay is not None else settings.snapshot_delay
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+            self._thread.start()
+
+    def schedule(self):
+        if self._thread is not None:
+            self._dirty.set()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            if self._stopping.wait(self.delay):
+                return
+            self._dirty.clear()
+            try:
+                if build_snapshot(wait=False) is None:
+                    # another worker is building; make sure our write gets in too
+                    self._dirty.set()
+            except Exception:
+                log.exception("snapshot build failed")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._dirty.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+
+
+snapshot_worker = SnapshotWorker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the catalog into static, content-hashed JSON files.")
+    parser.add_argument("--out", type=Path, default=None, help=f"output directory (default {settings.snapshot_dir})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    build_snapshot(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import bisect
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import islice
+
+# bounds on the work per keystroke, whatever the catalog size
+PREFIX_SCAN = 200           # sorted terms visited for a prefix
+TRIGRAM_CANDIDATES = 500    # slugs gathered from the rarest trigrams
+TRIGRAM_SCORED = 50         # of those, the best-overlapping ones get scored
+
+
+def normalize(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(value.lower().replace("-", " ").split())
+
+
+def trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """
+    In-process type-ahead index over culture names, slugs, regions and
+    languages. Prefix lookups go through a sorted term list (bisect), typo
+    tolerance through a trigram -> slug posting map. Nothing here touches
+    the database; routes keep it current via `upsert` / `remove`.
+    """
+
+    def __init__(self, min_similarity: float = 0.3):
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._terms: list[tuple[str, str]] = []            # sorted (term, slug)
+        self._grams: dict[str, set[str]] = defaultdict(set)  # trigram -> slugs
+        self._slug_terms: dict[str, list[str]] = {}
+        self._names: dict[str, str] = {}                     # slug -> normalized name
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _terms_for(slug, name, region, language) -> list[str]:
+        terms = {normalize(slug), normalize(name)}
+        terms.update(normalize(w) for w in name.split())
+        for extra in (region, language):
+            if extra:
+                terms.update(normalize(p) for p in extra.replace(";", ",").split(","))
+        return sorted(t for t in terms if t)
+
+    def _drop(self, slug: str):
+        for term in self._slug_terms.pop(slug, []):
+            i = bisect.bisect_left(self._terms, (term, slug))
+            if i < len(self._terms) and self._terms[i] == (term, slug):
+                del self._terms[i]
+            for g in trigrams(term):
+                posting = self._grams.get(g)
+                if posting is not None:
+                    posting.discard(slug)
+                    if not posting:
+                        del self._grams[g]
+        self._entries.pop(slug, None)
+        self._names.pop(slug, None)
+
+    def _add(self, slug, name, region, language):
+        terms = self._terms_for(slug, name, region, language)
+        self._entries[slug] = {"slug": slug, "name": name, "region": region}
+        self._slug_terms[slug] = terms
+        self._names[slug] = normalize(name)
+        for term in terms:
+            bisect.insort(self._terms, (term, slug))
+            for g in trigrams(term):
+                self._grams[g].add(slug)
+
+    def rebuild(self, rows):
+        """rows: iterable of (slug, name, region, language)."""
+        with self._lock:
+            self._entries.clear()
+            self._terms.clear()
+            self._grams.clear()
+            self._slug_terms.clear()
+            self._names.clear()
+            for slug, name, region, language in rows:
+                self._add(slug, name, region, language)
+
+    def upsert(self, culture, old_slug: str | None = None):
+        with self._lock:
+            self._drop(old_slug or culture.slug)
+            self._drop(culture.slug)
+            self._add(culture.slug, culture.name, culture.region, culture.language)
+
+    def remove(self, slug: str):
+        with self._lock:
+            self._drop(slug)
+
+    def suggest(self, query: str, limit: int = 8) -> list[dict]:
+        q = normalize(query)
+        if not q:
+            return []
+        scores: dict[str, float] = {}
+        with self._lock:
+            # prefix hits: 2.0 for the name itself, 1.0 + closeness otherwise
+            start = bisect.bisect_left(self._terms, (q, ""))
+            for term, slug in self._terms[start:start + PREFIX_SCAN]:
+                if not term.startswith(q):
+                    break
+                score = 2.0 if self._names[slug].startswith(q) else 1.0 + len(q) / len(term)
+                scores[slug] = max(scores.get(slug, 0.0), score)
+
+            if len(scores) < limit and len(q) >= 3:
+                # typo tolerance: dice coefficient over trigrams, best term per slug;
+                # candidates come from the rarest grams, common ones only add votes
+                q_grams = trigrams(q)
+                postings = sorted((self._grams[g] for g in q_grams if g in self._grams), key=len)
+                votes: Counter = Counter()
+                for posting in postings:
+                    if not votes:
+                        votes.update(islice(posting, TRIGRAM_CANDIDATES))
+                    elif len(votes) + len(posting) <= TRIGRAM_CANDIDATES:
+                        votes.update(posting)
+                    else:
+                        votes.update(slug for slug in list(votes) if slug in posting)
+                for slug, _ in votes.most_common(TRIGRAM_SCORED):
+                    if slug in scores:
+                        continue
+                    best = 0.0
+                    for term in self._slug_terms[slug]:
+                        t_grams = trigrams(term[:len(q) + 2])
+                        sim = 2 * len(q_grams & t_grams) / (len(q_grams) + len(t_grams))
+                        best = max(best, sim)
+                    if best >= self.min_similarity:
+                        scores[slug] = best
+
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self._entries[kv[0]]["name"]))
+            return [self._entries[slug] for slug, _ in ranked[:limit]]
+
+
+suggest_index = SuggestIndex()
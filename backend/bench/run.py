@@ -0,0 +1,347 @@
+"""
+Load test the API against a seeded database and a stub LLM.
+
+Boots the stub LLM and the app (uvicorn subprocesses), then runs a
+closed-loop workload: --concurrency workers issuing a weighted mix of
+requests for --duration seconds after --warmup. Writes per-endpoint
+throughput, error counts and p50/p95/p99 latencies as JSON, and compares
+against a stored baseline.
+
+    cd backend
+    python -m bench.run --cultures 10000 --concurrency 64 --duration 60 \\
+        --out bench-results.json --baseline bench-baseline.json
+
+Mix names: cultures, culture, search, media, quiz, chat, chat_stream.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+DEFAULT_MIX = "cultures=30,culture=20,search=20,media=10,quiz=8,chat=8,chat_stream=4"
+QUESTIONS = [
+    "What are their main traditions?",
+    "Which language do they speak?",
+    "How do they celebrate weddings?",
+    "What do they eat in winter?",
+    "Tell me about their music.",
+    "How do they make a living?",
+    "What is their history?",
+    "Do they have festivals?",
+]
+SEARCH_TERMS = ["river", "reindeer", "drum", "weaving", "harvest", "ka", "festival", "yurt", "shaman", "mar"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in REQUESTS:
+            raise SystemExit(f"unknown endpoint in mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# each builder returns (method, path, kwargs) for httpx
+def _cultures(rng, slugs):
+    return "GET", "/api/cultures/", {"params": {"cursor": "", "limit": 12, "view": "card"}}
+
+
+def _culture(rng, slugs):
+    return "GET", f"/api/cultures/{rng.choice(slugs)}", {}
+
+
+def _search(rng, slugs):
+    return "GET", "/api/cultures/search", {"params": {"query": rng.choice(SEARCH_TERMS), "limit": 10}}
+
+
+def _media(rng, slugs):
+    return "GET", "/api/media/", {"params": {"cursor": "", "limit": 20}}
+
+
+def _quiz(rng, slugs):
+    return "POST", f"/api/quiz/generate/{rng.choice(slugs)}", {}
+
+
+def _chat(rng, slugs):
+    return "POST", f"/api/chat/{rng.choice(slugs)}", {"json": {"question": rng.choice(QUESTIONS)}}
+
+
+def _chat_stream(rng, slugs):
+    return "POST", f"/api/chat/{rng.choice(slugs)}/stream", {"json": {"question": rng.choice(QUESTIONS)}}
+
+
+REQUESTS = {
+    "cultures": _cultures,
+    "culture": _culture,
+    "search": _search,
+    "media": _media,
+    "quiz": _quiz,
+    "chat": _chat,
+    "chat_stream": _chat_stream,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.statuses: dict[str, dict[str, int]] = {}
+
+    def add(self, name: str, seconds: float, status: int | str):
+        """status: HTTP status, or the exception class name for transport failures."""
+        self.latencies.setdefault(name, []).append(seconds)
+        key = str(status)
+        self.statuses.setdefault(name, {}).setdefault(key, 0)
+        self.statuses[name][key] += 1
+        if isinstance(status, str) or status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors.get(name, 0),
+                "statuses": self.statuses[name],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "endpoints": endpoints,
+            "total": {
+                "requests": total,
+                "errors": sum(e["errors"] for e in endpoints.values()),
+                "rps": round(total / elapsed, 2),
+            },
+        }
+
+
+async def drive(base_url: str, slugs: list[str], mix: dict[str, float], concurrency: int,
+                duration: float, warmup: float, seed: int) -> dict:
+    names, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(i: int):
+            rng = random.Random(seed * 1000 + i)
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    return
+                name = rng.choices(names, weights)[0]
+                method, path, kwargs = REQUESTS[name](rng, slugs)
+                began = time.perf_counter()
+                try:
+                    # read the full body: streaming endpoints count until the last event
+                    resp = await client.request(method, path, **kwargs)
+                    status = resp.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                ended = time.perf_counter()
+                if began >= measure_from and ended <= deadline:
+                    recorder.add(name, ended - began, status)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return recorder.summary(duration)
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Human-readable regressions: p95 up or throughput down by more than `tolerance`."""
+    regressions = []
+    for name, base in baseline.get("endpoints", {}).items():
+        cur = result["endpoints"].get(name)
+        if cur is None:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {cur['p95_ms']} ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {cur['rps']}")
+        base_rate = base["errors"] / max(base["requests"], 1)
+        cur_rate = cur["errors"] / max(cur["requests"], 1)
+        if cur_rate > base_rate + 0.01:
+            regressions.append(f"{name}: error rate {base_rate:.2%} -> {cur_rate:.2%}")
+    return regressions
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"process exited early ({proc.returncode}); see logs")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"timed out waiting for {url}")
+
+
+def print_table(result: dict, regressions: list[str]):
+    out = sys.stderr
+    print(f"{'endpoint':<14}{'reqs':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}", file=out)
+    for name, e in result["endpoints"].items():
+        print(f"{name:<14}{e['requests']:>8}{e['errors']:>6}{e['rps']:>9}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}", file=out)
+    t = result["total"]
+    print(f"{'total':<14}{t['requests']:>8}{t['errors']:>6}{t['rps']:>9}", file=out)
+    for line in regressions:
+        print("REGRESSION", line, file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="defaults to a fresh SQLite file in a temp dir")
+    parser.add_argument("--reuse-db", action="store_true", help="skip seeding, use --db-url as is")
+    parser.add_argument("--cultures", type=int, default=100)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--quiz-sets", type=int, default=1)
+    parser.add_argument("--media", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--llm-error-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline instead")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="culturology-bench-"))
+    db_url = args.db_url or f"sqlite:///{workdir / 'bench.db'}"
+    env = {**os.environ, "DATABASE_URL": db_url}
+    os.environ.update(env)
+
+    from sqlalchemy import create_engine, text
+    from .seed import seed
+
+    if args.reuse_db:
+        engine = create_engine(db_url)
+        with engine.connect() as conn:
+            slugs = [r[0] for r in conn.execute(text("SELECT slug FROM cultures"))]
+        engine.dispose()
+    else:
+        print(f"seeding {args.cultures} cultures ...", file=sys.stderr)
+        slugs = seed(db_url, args.cultures, args.images, args.quiz_sets, media=args.media, seed=args.seed)
+    if not slugs:
+        raise SystemExit("database has no cultures")
+
+    llm_port, app_port = free_port(), free_port()
+    stub_env = {
+        **env,
+        "STUB_LATENCY_MS": str(args.llm_latency_ms),
+        "STUB_JITTER_MS": str(args.llm_jitter_ms),
+        "STUB_TOKEN_MS": str(args.llm_token_ms),
+        "STUB_ERROR_RATE": str(args.llm_error_rate),
+    }
+    app_env = {
+        **env,
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "bench"),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}",
+        # the background warmer would compete with the measured traffic
+        "QUIZ_BANK_SIZE": "0",
+        # all traffic comes from one IP: measure the endpoints, not the rate limits
+        **{
+            name: env.get(name, "1000000")
+            for name in ("ADMISSION_CLIENT_RATE", "ADMISSION_CLIENT_BURST",
+                         "ADMISSION_GLOBAL_RATE", "ADMISSION_GLOBAL_BURST")
+        },
+    }
+    uvicorn = [sys.executable, "-m", "uvicorn", "--log-level", "warning", "--host", "127.0.0.1"]
+    procs = []
+    try:
+        with open(workdir / "stub.log", "w") as stub_log, open(workdir / "app.log", "w") as app_log:
+            procs.append(subprocess.Popen(
+                [*uvicorn, "--port", str(llm_port), "bench.stub_llm:app"],
+                env=stub_env, stdout=stub_log, stderr=subprocess.STDOUT,
+            ))
+            procs.append(subprocess.Popen(
+                [*uvicorn, "--port", str(app_port), "--workers", str(args.app_workers), "app.main:app"],
+                env=app_env, stdout=app_log, stderr=subprocess.STDOUT,
+            ))
+            wait_ready(f"http://127.0.0.1:{llm_port}/docs", procs[0])
+            wait_ready(f"http://127.0.0.1:{app_port}/api/openapi.json", procs[1])
+
+            print(f"running {args.duration}s at concurrency {args.concurrency} (logs in {workdir})", file=sys.stderr)
+            result = asyncio.run(drive(
+                f"http://127.0.0.1:{app_port}", slugs, parse_mix(args.mix),
+                args.concurrency, args.duration, args.warmup, args.seed,
+            ))
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    result["config"] = {
+        "db": db_url.split("://")[0],
+        "cultures": len(slugs),
+        "mix": parse_mix(args.mix),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_token_ms": args.llm_token_ms,
+        "app_workers": args.app_workers,
+    }
+
+    regressions = []
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(result, indent=2))
+    elif args.baseline and Path(args.baseline).exists():
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        result["regressions"] = regressions
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(output)
+    else:
+        print(output)
+    print_table(result, regressions)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
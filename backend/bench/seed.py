@@ -0,0 +1,145 @@
+"""
+Deterministic catalog seeding for benchmarks.
+
+    python -m bench.seed --db-url sqlite:////tmp/bench.db --cultures 10000
+"""
+import argparse
+import os
+import random
+
+from sqlalchemy import create_engine, insert, select
+
+SYLLABLES = [
+    "ka", "mi", "to", "ra", "nu", "sha", "el", "do", "vi", "ya", "ur", "ba",
+    "zen", "lo", "qua", "ti", "mar", "ok", "han", "si",
+]
+WORDS = [
+    "river", "mountain", "reindeer", "harvest", "drum", "weaving", "song", "dance",
+    "fishing", "herding", "ceremony", "festival", "ancestors", "forest", "desert",
+    "island", "pottery", "horse", "nomadic", "village", "market", "shaman", "mask",
+    "feast", "winter", "summer", "tea", "rice", "salt", "canoe", "felt", "yurt",
+    "carving", "story", "elders", "wedding", "hunt", "tattoo", "beads", "bread",
+]
+REGIONS = ["Arctic", "Siberia", "Andes", "Amazon", "Sahel", "Pacific", "Himalaya", "Steppe", "Kalahari", "Balkans"]
+BATCH = 1000
+
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _chunks(rows, size=BATCH):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def seed(db_url: str, cultures: int, images: int = 4, quiz_sets: int = 1,
+         quizzes: int = 3, media: int = 200, seed: int = 42):
+    """Create the schema and fill it; returns the seeded slugs."""
+    from app.database.migrate import migrate
+    from app.database.session import Base
+    from app.models.culture import Culture
+    from app.models.culture_image import CultureImage
+    from app.models.media_item import MediaItem
+    from app.models.quiz import Quiz
+    from app.models.quiz_set import QuizSet
+    from app.utils.quiz_bank import content_hash
+
+    rng = random.Random(seed)
+    engine = create_engine(db_url)
+    Base.metadata.drop_all(engine)
+    migrate(engine)
+
+    docs, seen = [], set()
+    while len(docs) < cultures:
+        name = _name(rng)
+        slug = f"{name.lower()}-{len(docs)}"
+        if slug in seen:
+            continue
+        seen.add(slug)
+        docs.append({
+            "slug": slug,
+            "name": name,
+            "region": rng.choice(REGIONS),
+            "location": f"{rng.choice(REGIONS)} {rng.choice(WORDS)}",
+            "population": rng.randint(100, 2_000_000),
+            "language": _name(rng),
+            "about": _text(rng, rng.randint(60, 200)),
+            "traditions": _text(rng, rng.randint(40, 150)),
+            "lifestyle": _text(rng, rng.randint(40, 150)),
+            "latitude": round(rng.uniform(-60, 75), 5),
+            "longitude": round(rng.uniform(-180, 180), 5),
+        })
+
+    with engine.begin() as conn:
+        for chunk in _chunks(docs):
+            conn.execute(insert(Culture.__table__), chunk)
+        ids = dict(conn.execute(select(Culture.slug, Culture.id)).all())
+
+        gallery = [
+            {"culture_id": ids[d["slug"]], "url": f"https://img.example.com/{d['slug']}/{p}.jpg",
+             "caption": _text(rng, 5), "position": p}
+            for d in docs for p in range(images)
+        ]
+        for chunk in _chunks(gallery):
+            conn.execute(insert(CultureImage.__table__), chunk)
+
+        question = {
+            "id": 1, "question": "Which tradition is described?",
+            "options": {"A": "drum", "B": "song", "C": "dance", "D": "feast"}, "correct": "A",
+        }
+        sets = [
+            {"culture_id": ids[d["slug"]], "content_hash": content_hash(_Doc(d)),
+             "items": [{**question, "id": i} for i in range(1, 6)]}
+            for d in docs for _ in range(quiz_sets)
+        ]
+        for chunk in _chunks(sets):
+            conn.execute(insert(QuizSet.__table__), chunk)
+
+        legacy = [
+            {"culture_id": ids[d["slug"]], "question": f"What is {d['name']} known for?",
+             "answer": rng.choice(WORDS)}
+            for d in docs for _ in range(quizzes)
+        ]
+        for chunk in _chunks(legacy):
+            conn.execute(insert(Quiz.__table__), chunk)
+
+        items = [
+            {"type": rng.choice(["video", "audio"]), "url": f"https://media.example.com/{i}",
+             "thumbnail": f"https://media.example.com/{i}/thumb.jpg", "caption": _text(rng, 6),
+             "duration": rng.randint(10, 900)}
+            for i in range(media)
+        ]
+        for chunk in _chunks(items):
+            conn.execute(insert(MediaItem.__table__), chunk)
+    engine.dispose()
+    return [d["slug"] for d in docs]
+
+
+class _Doc:
+    def __init__(self, doc: dict):
+        self.__dict__.update(doc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument("--cultures", type=int, default=100)
+    parser.add_argument("--images", type=int, default=4, help="gallery images per culture")
+    parser.add_argument("--quiz-sets", type=int, default=1, help="warm quiz sets per culture")
+    parser.add_argument("--quizzes", type=int, default=3, help="legacy quiz rows per culture")
+    parser.add_argument("--media", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    # the app modules build their engines from DATABASE_URL on import
+    os.environ.setdefault("DATABASE_URL", args.db_url)
+    slugs = seed(args.db_url, args.cultures, args.images, args.quiz_sets, args.quizzes, args.media, args.seed)
+    print(f"seeded {len(slugs)} cultures into {args.db_url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cold-start budget check: time `import app.main` and the lifespan startup
+in fresh interpreters (median of --runs) and fail when over budget.
+
+    python -m bench.startup --db-url sqlite:////tmp/bench.db --import-budget-ms 1500 --startup-budget-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from app.main import app
+t1 = time.perf_counter()
+async def boot():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+t2 = asyncio.run(boot())
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000}))
+"""
+
+
+IMPORT_BUDGET_MS = 1500
+STARTUP_BUDGET_MS = 500
+
+
+def measure(env: dict, runs: int = 5) -> dict:
+    """Median import/startup milliseconds over `runs` fresh interpreters."""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        key: round(statistics.median(s[key] for s in samples), 1)
+        for key in ("import_ms", "startup_ms")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="an already migrated database (default: DATABASE_URL)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.db_url:
+        env["DATABASE_URL"] = args.db_url
+    env.setdefault("QUIZ_BANK_SIZE", "0")
+
+    result = measure(env, args.runs)
+    over = [
+        f"{key} {result[key]} > {budget}"
+        for key, budget in (("import_ms", args.import_budget_ms), ("startup_ms", args.startup_budget_ms))
+        if result[key] > budget
+    ]
+    result["over_budget"] = over
+    print(json.dumps(result))
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
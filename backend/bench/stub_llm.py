@@ -0,0 +1,81 @@
+"""
+OpenAI-compatible stand-in for benchmarks: POST /chat/completions with a
+configurable think time, per-token streaming delay and error rate. Point
+the app's OPENAI_BASE_URL at it.
+
+    STUB_LATENCY_MS=400 python -m uvicorn bench.stub_llm:app --port 9100
+"""
+import asyncio
+import json
+import os
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("STUB_JITTER_MS", "100"))
+TOKEN_MS = float(os.getenv("STUB_TOKEN_MS", "15"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+
+ANSWER = (
+    "They are known for seasonal ceremonies, drum songs passed down by elders, "
+    "and a lifestyle that follows the herds between summer and winter pastures."
+)
+QUESTION = {
+    "question": "Which tradition is described?",
+    "options": {"A": "drum", "B": "song", "C": "dance", "D": "feast"},
+    "correct": "A",
+}
+
+app = FastAPI()
+
+
+def _questions():
+    return [{"id": i, **QUESTION} for i in range(1, 6)]
+
+
+def _content(body: dict) -> str:
+    schema = (body.get("response_format") or {}).get("json_schema")
+    if schema:
+        return json.dumps({slug: _questions() for slug in schema["schema"]["required"]})
+    # batch prompt in plain JSON mode: the keys are only in the text
+    keys = re.findall(r"^### key: (.+)$", body["messages"][-1]["content"], re.M)
+    if keys:
+        return json.dumps({key: _questions() for key in keys})
+    if "quiz" in json.dumps(body["messages"][0]).lower():
+        return json.dumps({"questions": _questions()})
+    return ANSWER
+
+
+def _usage(body: dict, content: str) -> dict:
+    prompt = sum(len(m.get("content", "").split()) for m in body["messages"])
+    return {"prompt_tokens": prompt, "completion_tokens": len(content.split()),
+            "total_tokens": prompt + len(content.split())}
+
+
+@app.post("/chat/completions")
+async def completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000)
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "stub overloaded"}}, status_code=503)
+
+    content = _content(body)
+    if not body.get("stream"):
+        return {
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            "usage": _usage(body, content),
+        }
+
+    async def events():
+        for word in content.split(" "):
+            await asyncio.sleep(TOKEN_MS / 1000)
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield f"data: {json.dumps({'choices': [], 'usage': _usage(body, content)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+# settings are read at import time: point everything at a throwaway
+# SQLite file and keep the LLM-backed background work off
+_tmp = tempfile.mkdtemp(prefix="culturology-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["DATABASE_REPLICA_URLS"] = "[]"
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["SNAPSHOT_ON_WRITE"] = "0"
+
+import pytest  # noqa: E402
+
+from app.database.migrate import migrate  # noqa: E402
+from app.database.session import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    migrate()
+    return engine
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with database.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
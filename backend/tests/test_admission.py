@@ -0,0 +1,112 @@
+import asyncio
+
+import anyio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils import admission as admission_module
+from app.utils.admission import AdmissionController, AdmissionPool, MemoryAdmissionBackend
+
+
+def request_from(host: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (host, 1234)})
+
+
+def controller(limit=1, queue_size=1, timeout=1.0, burst=3) -> AdmissionController:
+    ctl = AdmissionController(MemoryAdmissionBackend())
+    ctl.client_rate, ctl.client_burst = 0.01, burst
+    ctl.global_rate, ctl.global_burst = 1000, 1000
+    ctl.pools["llm"] = AdmissionPool("llm", ctl.backend, limit, queue_size, timeout, lease=60)
+    return ctl
+
+
+def test_client_past_its_burst_gets_429_with_retry_after():
+    async def scenario():
+        ctl = controller(limit=10, burst=3)
+        for _ in range(3):
+            await (await ctl.admit(request_from("10.0.0.1"))).release()
+        with pytest.raises(HTTPException) as rejected:
+            await ctl.admit(request_from("10.0.0.1"))
+        # other clients have their own bucket
+        await (await ctl.admit(request_from("10.0.0.2"))).release()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+
+def test_released_slot_goes_to_the_queued_request():
+    async def scenario():
+        ctl = controller(limit=1, queue_size=1)
+        pool = ctl.pools["llm"]
+        first = await ctl.admit(request_from("10.0.0.1"))
+        waiting = asyncio.create_task(ctl.admit(request_from("10.0.0.2")))
+        await asyncio.sleep(0.01)
+        assert len(pool._queue) == 1
+
+        with pytest.raises(HTTPException) as full:
+            await ctl.admit(request_from("10.0.0.3"))
+        assert full.value.status_code == 503
+
+        await first.release()
+        second = await asyncio.wait_for(waiting, 1)
+        assert len(pool._queue) == 0
+        await second.release()
+        await second.release()  # idempotent
+        return ctl.backend._slots[pool.key]
+
+    assert asyncio.run(scenario()) == {}
+
+
+def test_queue_timeout_gives_up_its_place():
+    async def scenario():
+        ctl = controller(limit=1, queue_size=1, timeout=0.1)
+        held = await ctl.admit(request_from("10.0.0.1"))
+        with pytest.raises(HTTPException) as timed_out:
+            await ctl.admit(request_from("10.0.0.2"))
+        assert len(ctl.pools["llm"]._queue) == 0
+        await held.release()
+        return timed_out.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_refilled_buckets_are_dropped(monkeypatch):
+    async def scenario():
+        backend = MemoryAdmissionBackend()
+        await backend.take([("rate:llm:client:a", 1000, 5)])
+        await asyncio.sleep(0.01)  # refilled
+        monkeypatch.setattr(admission_module, "SWEEP_INTERVAL", 0)
+        await backend.take([("rate:llm:client:b", 1000, 5)])
+        return set(backend._buckets)
+
+    assert asyncio.run(scenario()) == {"rate:llm:client:b"}
+
+
+def test_global_rejection_does_not_cost_the_client_a_token():
+    async def scenario():
+        ctl = controller(limit=10, burst=1)
+        ctl.global_rate, ctl.global_burst = 0.01, 1
+        await (await ctl.admit(request_from("10.0.0.1"))).release()
+        with pytest.raises(HTTPException) as busy:
+            await ctl.admit(request_from("10.0.0.2"))
+        ctl.global_rate = 1000
+        await asyncio.sleep(0.01)  # global capacity is back
+        await (await ctl.admit(request_from("10.0.0.2"))).release()
+        return busy.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_cancelled_release_still_frees_the_slot():
+    async def scenario():
+        ctl = controller(limit=1)
+        ticket = await ctl.admit(request_from("10.0.0.1"))
+        with anyio.CancelScope() as scope:
+            scope.cancel()
+            await ticket.release()
+        return ticket.released, ctl.backend._slots[ctl.pools["llm"].key]
+
+    assert asyncio.run(scenario()) == (True, {})
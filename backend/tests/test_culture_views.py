@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import raiseload
+
+from app.models.culture import Culture
+from app.models.culture_image import CultureImage
+from app.schemas.culture import CultureOut
+from app.utils.culture_views import culture_query
+
+
+@pytest.fixture
+def cultures(db):
+    for i in range(3):
+        culture = Culture(slug=f"culture-{i}", name=f"Culture {i}")
+        culture.gallery = [CultureImage(url=f"/assets/{i}-{n}.webp", position=n) for n in range(2)]
+        db.add(culture)
+    db.commit()
+    db.expunge_all()
+
+
+@pytest.fixture
+def statements(database):
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(database, "before_cursor_execute", record)
+    yield seen
+    event.remove(database, "before_cursor_execute", record)
+
+
+def test_culture_query_loads_galleries_in_one_batch(db, cultures, statements):
+    out = [CultureOut.from_orm(c) for c in culture_query(db).order_by(Culture.id)]
+
+    assert [len(c.gallery) for c in out] == [2, 2, 2]
+    assert len(statements) == 2  # cultures, then one IN query for every gallery
+
+
+def test_lazy_load_outside_the_eager_path_raises(db, cultures):
+    # the same no-lazy-loads policy, minus the gallery eager load
+    culture = db.query(Culture).options(raiseload("*")).first()
+
+    with pytest.raises(InvalidRequestError):
+        CultureOut.from_orm(culture)
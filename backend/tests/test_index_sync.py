@@ -0,0 +1,52 @@
+from app.utils.cache import MemoryCache
+from app.utils.index_sync import IndexSync
+
+
+def workers(n=2):
+    backend = MemoryCache()
+    syncs, calls = [], []
+    for i in range(n):
+        sync = IndexSync(backend)
+        sync.register("suggest", lambda i=i: calls.append(i))
+        syncs.append(sync)
+    return syncs, calls
+
+
+def test_other_workers_resync_after_a_write():
+    (writer, reader), calls = workers()
+
+    writer.bump()
+
+    assert reader.refresh()
+    assert not writer.refresh()
+    assert calls == [1]
+    assert not reader.refresh()
+
+
+def test_writer_resyncs_when_another_worker_wrote_in_between():
+    (a, b), calls = workers()
+
+    b.bump()
+    a.bump()
+
+    assert a.refresh()
+    assert b.refresh()
+    assert calls == [0, 1]
+
+
+def test_failed_sync_is_retried():
+    (writer, reader), _ = workers()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database is down")
+
+    reader.register("suggest", flaky)
+    writer.bump()
+
+    assert reader.refresh()
+    assert reader.refresh()
+    assert not reader.refresh()
+    assert len(attempts) == 2
@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+from app.models.culture import Culture
+from app.utils.pagination import decode_cursor, encode_cursor
+
+ORDER = [(Culture.name, False), (Culture.id, False)]
+
+
+def test_cursor_round_trips():
+    assert decode_cursor(encode_cursor(["Inuit", 7]), ORDER) == ["Inuit", 7]
+
+
+@pytest.mark.parametrize("values", [[[1], {}], ["Inuit", "7"], ["Inuit", True], [None, 7], ["Inuit"]])
+def test_malformed_cursor_is_a_400(values):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(encode_cursor(values), ORDER)
+    assert e.value.status_code == 400
@@ -0,0 +1,40 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import quiz_batch
+
+QUESTION = {"id": 1, "question": "Q?", "options": dict(zip("ABCD", "abcd")), "correct": "A"}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def chat(self, messages, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=json.dumps({"inuit": [QUESTION]}))
+
+
+@pytest.mark.parametrize("model, kind", [
+    ("gpt-4o-mini", "json_schema"),
+    ("gpt-4o-2024-08-06", "json_schema"),
+    ("gpt-4o-2024-05-13", "json_object"),
+    ("gpt-3.5-turbo", "json_object"),
+])
+def test_batch_asks_for_the_schema_only_where_the_model_supports_it(monkeypatch, model, kind):
+    llm = FakeLLM()
+    monkeypatch.setattr(quiz_batch, "get_llm", lambda: llm)
+    monkeypatch.setattr(quiz_batch, "BATCH_MODEL", model)
+    culture = SimpleNamespace(
+        slug="inuit", name="Inuit", region=None, location=None, language=None, population=None,
+        about="Inuit hunters build igloos.", traditions="", lifestyle="",
+    )
+
+    ok, errors = asyncio.run(quiz_batch.generate_batch([culture]))
+
+    assert llm.calls[0]["model"] == model
+    assert llm.calls[0]["response_format"]["type"] == kind
+    assert list(ok) == ["inuit"] and not errors
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine
+
+from app.config import settings
+from app.database.replicas import ReplicaSet
+
+
+def test_repeated_invalidations_share_one_timer(monkeypatch):
+    monkeypatch.setattr(settings, "read_your_writes_seconds", 0.05)
+    calls = []
+
+    async def scenario():
+        replicas = ReplicaSet(create_engine("sqlite://"), [create_engine("sqlite://")])
+        replicas.start()
+        # writes arrive from threadpool threads
+        writers = [threading.Thread(target=replicas.after_catch_up, args=(calls.append, "cultures:list"))
+                   for _ in range(50)]
+        for w in writers:
+            w.start()
+        for w in writers:
+            w.join()
+        await asyncio.sleep(0.01)
+        pending = dict(replicas._repeat)
+        await asyncio.sleep(0.2)
+        left = dict(replicas._repeat)
+        await replicas.stop()
+        return pending, left
+
+    pending, left = asyncio.run(scenario())
+    assert len(pending) == 1
+    assert left == {}
+    assert 1 <= len(calls) <= 2 and set(calls) == {"cultures:list"}
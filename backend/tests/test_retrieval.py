@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+from app.utils import retrieval
+from app.utils.retrieval import VectorIndex, chunk_culture, culture_context
+
+
+def make_culture(slug, name, about, traditions="", lifestyle=""):
+    return SimpleNamespace(
+        slug=slug, name=name, region=None, location=None, language=None, population=None,
+        about=about, traditions=traditions, lifestyle=lifestyle,
+    )
+
+
+CULTURES = [
+    make_culture("inuit", "Inuit", "Inuit hunters build igloos from snow blocks and hunt seals on the sea ice."),
+    make_culture("maori", "Maori", "Maori carve wooden meeting houses and perform the haka before battle."),
+    make_culture("sami", "Sami", "Sami families herd reindeer across the tundra and sing joik songs."),
+]
+
+
+def index():
+    ix = VectorIndex(dim=256)
+    ix.rebuild(CULTURES)
+    return ix
+
+
+def test_search_finds_the_culture_the_query_is_about():
+    score, slug, text = index().search("reindeer herding on the tundra", k=1)[0]
+
+    assert slug == "sami"
+    assert "reindeer" in text
+
+
+def test_search_restricted_to_a_culture_only_returns_its_chunks():
+    ix = index()
+
+    results = ix.search("reindeer tundra", slug="maori", k=10)
+
+    assert results
+    assert {slug for _, slug, _ in results} == {"maori"}
+    assert ix.search("reindeer", slug="unknown") == []
+
+
+def test_upsert_and_remove_keep_other_cultures_rows():
+    ix = index()
+    ix.upsert(make_culture("maori", "Maori", "Maori weave flax cloaks."), old_slug="maori")
+    ix.remove("inuit")
+
+    assert ix.search("flax cloaks", k=1)[0][1] == "maori"
+    assert ix.search("seals igloos", slug="inuit") == []
+    assert ix.search("reindeer", k=1)[0][1] == "sami"
+
+
+def test_culture_context_leads_with_the_facts_line():
+    notes = culture_context(CULTURES[0], "how do they hunt seals")
+
+    assert notes[0].startswith("Inuit culture.")
+    assert all("Maori" not in note for note in notes)
+
+
+def test_searches_and_writes_do_not_wait_for_a_rebuild():
+    import threading
+
+    ix = index()
+    release = threading.Event()
+
+    def slow_catalog():
+        yield CULTURES[0]
+        release.wait(5)
+        yield CULTURES[2]
+
+    build = threading.Thread(target=ix.rebuild, args=(slow_catalog(),))
+    build.start()
+    try:
+        # served from the old contents while the new ones are embedded
+        assert ix.search("haka meeting houses", k=1)[0][1] == "maori"
+        ix.upsert(make_culture("aztec", "Aztec", "Aztecs built Tenochtitlan on a lake."))
+    finally:
+        release.set()
+        build.join()
+
+    assert ix.search("Tenochtitlan lake", k=1)[0][1] == "aztec"
+    assert ix.search("haka", slug="maori") == []
+
+
+def test_sync_reembeds_changed_cultures_and_drops_deleted_ones():
+    ix = index()
+    edited = make_culture("maori", "Maori", "Maori navigators sailed outrigger canoes by the stars.")
+
+    ix.sync([CULTURES[0], edited])
+
+    assert ix.search("outrigger canoes and stars", k=1)[0][1] == "maori"
+    assert ix.search("reindeer", slug="sami") == []
+    assert ix.is_current("inuit", chunk_culture(CULTURES[0]))
+
+
+def test_culture_context_uses_the_live_text_when_the_index_is_stale(monkeypatch):
+    monkeypatch.setattr(retrieval, "vector_index", index())
+    edited = make_culture("sami", "Sami", "Sami fishermen net salmon in the rivers of the north.")
+
+    notes = culture_context(edited, "reindeer herding")
+
+    assert any("salmon" in note for note in notes)
+    assert all("reindeer" not in note for note in notes)
@@ -0,0 +1,22 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+def test_startup_does_not_wait_for_the_vector_index(database, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(10)
+
+    monkeypatch.setattr(main, "build_vector_index", slow_build)
+    with TestClient(main.app) as client:
+        try:
+            # lifespan is done and serving while the build is still blocked
+            assert started.wait(5)
+            assert client.get("/api/cultures/suggest", params={"q": "in"}).status_code == 200
+        finally:
+            release.set()